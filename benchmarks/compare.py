@@ -0,0 +1,63 @@
+"""
+Compares the results of benchmarks/suite.py with a baseline and reports slowdowns.
+
+    PYTHONPATH=. python benchmarks/suite.py --output baseline.json
+    # ...change something...
+    PYTHONPATH=. python benchmarks/suite.py --output current.json
+    python benchmarks/compare.py baseline.json current.json --threshold 0.2
+
+The exit code is 1 if any benchmark became slower than the baseline by more than the threshold.
+"""
+import json
+import sys
+from argparse import ArgumentParser
+from typing import Dict, List, Optional
+
+
+def load_results(path: str) -> Dict[str, float]:
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)['results']  # type: ignore[no-any-return]
+
+
+def compare(baseline: Dict[str, float], current: Dict[str, float], threshold: float) -> List[str]:
+    slowdowns = []
+
+    for name in sorted(baseline.keys() | current.keys()):
+        if name not in current:
+            sys.stdout.write(f'{name:<36} {"missing in the current results":>40}\n')
+            continue
+        if name not in baseline:
+            sys.stdout.write(f'{name:<36} {"new":>40}\n')
+            continue
+
+        ratio = current[name] / baseline[name]
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = '  SLOWER'
+            slowdowns.append(name)
+        elif ratio < 1 - threshold:
+            mark = '  faster'
+
+        sys.stdout.write(f'{name:<36} {baseline[name] * 1e6:>12.3f} us {current[name] * 1e6:>12.3f} us {ratio:>8.2f}x{mark}\n')
+
+    return slowdowns
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = ArgumentParser(description='Compare benchmark results with a baseline.')
+    parser.add_argument('baseline', help='A JSON file with the baseline results.')
+    parser.add_argument('current', help='A JSON file with the current results.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='The allowed relative slowdown, 0.2 means 20%%.')
+    parsed_arguments = parser.parse_args(arguments)
+
+    slowdowns = compare(load_results(parsed_arguments.baseline), load_results(parsed_arguments.current), parsed_arguments.threshold)
+
+    if slowdowns:
+        sys.stdout.write(f'\nSlower than the baseline: {", ".join(slowdowns)}.\n')
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
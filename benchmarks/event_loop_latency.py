@@ -0,0 +1,58 @@
+"""
+Latency of the event loop while blocking templates are executed in it.
+
+Run it with the package installed or from the root of the repository:
+
+    PYTHONPATH=. python benchmarks/event_loop_latency.py
+
+A ticker task asks the loop to wake it up every few milliseconds and measures how late it was woken up. The "async function" column is the variant from get_async_function(), which executes the blocking code right in the loop. The "offloaded" column is the variant from get_offloaded_async_function(), which executes it in a thread pool.
+"""
+import sys
+from asyncio import gather, run, sleep
+from time import perf_counter
+from time import sleep as blocking_sleep
+from typing import Any, Callable, List
+
+from transfunctions import transfunction
+
+TICK = 0.005
+BLOCKING_TIME = 0.02
+NUMBERS_OF_CALLS = (1, 10, 50)
+
+
+# The template is decorated as a usual function here, so the check of the decorator is turned off.
+def blocking_template():
+    blocking_sleep(BLOCKING_TIME)
+
+
+async def measure_latency(function: Callable[[], Any], number_of_calls: int) -> float:
+    delays: List[float] = []
+    finished = False
+
+    async def ticker() -> None:
+        while not finished:
+            start_time = perf_counter()
+            await sleep(TICK)
+            delays.append(perf_counter() - start_time - TICK)
+
+    async def load() -> None:
+        nonlocal finished
+        for _ in range(number_of_calls):
+            await function()
+        finished = True
+
+    await gather(ticker(), load())
+
+    return max(delays)
+
+
+if __name__ == '__main__':
+    template = transfunction(check_decorators=False)(blocking_template)
+    async_function = template.get_async_function()
+    offloaded_function = template.get_offloaded_async_function()
+
+    sys.stdout.write(f'{"calls":>8} {"async function, ms":>20} {"offloaded, ms":>16}\n')
+    for number_of_calls in NUMBERS_OF_CALLS:
+        async_latency = run(measure_latency(async_function, number_of_calls))
+        offloaded_latency = run(measure_latency(offloaded_function, number_of_calls))
+        sys.stdout.write(f'{number_of_calls:>8} {async_latency * 1e3:>20.1f} {offloaded_latency * 1e3:>16.1f}\n')
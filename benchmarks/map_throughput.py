@@ -0,0 +1,71 @@
+"""
+Throughput of the map_it marker depending on the limit of concurrency.
+
+Run it with the package installed or from the root of the repository:
+
+    PYTHONPATH=. python benchmarks/map_throughput.py
+
+Each item takes a fixed time, like a request to a remote service. The async function waits with asyncio.sleep(), the usual function blocks its thread with time.sleep(). The columns show how many items per second each of them processes.
+"""
+import sys
+from asyncio import run
+from asyncio import sleep as async_sleep
+from time import perf_counter
+from time import sleep as blocking_sleep
+
+from transfunctions import (
+    async_context,
+    await_it,
+    map_it,
+    sync_context,
+    transfunction,
+)
+
+NUMBER_OF_ITEMS = 200
+ITEM_TIME = 0.01
+LIMITS = (1, 4, 16, 64)
+
+
+async def fetch_async(item):
+    await async_sleep(ITEM_TIME)
+    return item
+
+
+def fetch(item):
+    blocking_sleep(ITEM_TIME)
+    return item
+
+
+# The template is decorated as a usual function here, so the check of the decorator is turned off.
+def fetch_all(items, limit):
+    with sync_context:
+        return map_it(fetch, items, limit=limit)
+    with async_context:
+        return map_it(fetch_async, items, limit=limit)
+
+
+# The same thing without the marker, one item after another.
+def fetch_all_one_by_one(items):
+    with sync_context:
+        return [fetch(item) for item in items]
+    with async_context:
+        return [await_it(fetch_async(item)) for item in items]
+
+
+def measure(function, *args):
+    start_time = perf_counter()
+    result = function(*args)
+    if hasattr(result, '__await__'):
+        run(result)
+    return NUMBER_OF_ITEMS / (perf_counter() - start_time)
+
+
+if __name__ == '__main__':
+    template = transfunction(check_decorators=False)(fetch_all)
+    one_by_one_template = transfunction(check_decorators=False)(fetch_all_one_by_one)
+    items = list(range(NUMBER_OF_ITEMS))
+
+    sys.stdout.write(f'{"limit":>10} {"usual, items/s":>16} {"async, items/s":>16}\n')
+    sys.stdout.write(f'{"no marker":>10} {measure(one_by_one_template.get_usual_function(), items):>16.0f} {measure(one_by_one_template.get_async_function(), items):>16.0f}\n')
+    for limit in LIMITS:
+        sys.stdout.write(f'{limit:>10} {measure(template.get_usual_function(), items, limit):>16.0f} {measure(template.get_async_function(), items, limit):>16.0f}\n')
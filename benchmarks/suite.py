@@ -0,0 +1,252 @@
+"""
+Micro-benchmarks of the library: decoration, the first generation of each type of function, the lookup of already generated functions and the overhead of calling superfunctions compared to ordinary functions.
+
+Run it with the package installed or from the root of the repository:
+
+    PYTHONPATH=. python benchmarks/suite.py --output results.json
+
+The results can be compared with a saved baseline using benchmarks/compare.py.
+"""
+import json
+import sys
+from argparse import ArgumentParser
+from timeit import Timer
+from typing import Any, Callable, Dict, List, Optional
+
+from transfunctions import (
+    async_context,
+    disable_bytecode_cache,
+    generator_context,
+    superfunction,
+    sync_context,
+    transfunction,
+)
+from transfunctions import transformer as transformer_module
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def benchmark(function: Callable[[], Callable[[], Any]]) -> Callable[[], Callable[[], Any]]:
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def drive(awaitable: Any) -> Any:
+    # The coroutines here never suspend, so they can be finished without an event loop, which would be the main cost otherwise.
+    try:
+        awaitable.__await__().send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('The coroutine is suspended.')  # pragma: no cover
+
+
+# The templates are decorated as usual functions here, so the check of the decorator is turned off.
+def template_function(number):
+    with sync_context:
+        return number + 1
+    with async_context:
+        return number + 2
+    with generator_context:
+        yield number + 3
+
+
+def superfunction_template(number):
+    with sync_context:
+        return number + 1
+    with async_context:
+        return number + 2
+    with generator_context:
+        yield number + 3
+
+
+def superfunction_template_without_tilde(number):
+    pass
+
+
+def long_superfunction_template(number):
+    with generator_context:
+        yield from range(number)
+
+
+def long_generator_function(number):
+    yield from range(number)
+
+
+def usual_function(number):
+    return number + 1
+
+
+async def async_function(number):
+    return number + 2
+
+
+def generator_function(number):
+    yield number + 3
+
+
+def create_cold_transformer() -> Any:
+    # The shared cache would turn every generation after the first one into a simple lookup.
+    transformer_module.shared_code_cache.clear()
+    return transfunction(check_decorators=False)(template_function)
+
+
+@benchmark
+def decorate_transfunction() -> Callable[[], Any]:
+    return lambda: transfunction(check_decorators=False)(template_function)
+
+
+@benchmark
+def decorate_superfunction() -> Callable[[], Any]:
+    return lambda: superfunction(check_decorators=False)(superfunction_template)
+
+
+def create_cold_generation(method_name: str) -> Callable[[], Any]:
+    return lambda: getattr(create_cold_transformer(), method_name)()
+
+
+@benchmark
+def cold_usual_function() -> Callable[[], Any]:
+    return create_cold_generation('get_usual_function')
+
+
+@benchmark
+def cold_async_function() -> Callable[[], Any]:
+    return create_cold_generation('get_async_function')
+
+
+@benchmark
+def cold_generator_function() -> Callable[[], Any]:
+    return create_cold_generation('get_generator_function')
+
+
+@benchmark
+def warm_usual_function() -> Callable[[], Any]:
+    template = transfunction(check_decorators=False)(template_function)
+    template.get_usual_function()
+    return template.get_usual_function
+
+
+@benchmark
+def warm_async_function() -> Callable[[], Any]:
+    template = transfunction(check_decorators=False)(template_function)
+    template.get_async_function()
+    return template.get_async_function
+
+
+@benchmark
+def warm_generator_function() -> Callable[[], Any]:
+    template = transfunction(check_decorators=False)(template_function)
+    template.get_generator_function()
+    return template.get_generator_function
+
+
+@benchmark
+def call_usual_function() -> Callable[[], Any]:
+    return lambda: usual_function(1)
+
+
+@benchmark
+def call_superfunction_with_tilde() -> Callable[[], Any]:
+    function = superfunction(check_decorators=False)(superfunction_template)
+    return lambda: ~function(1)
+
+
+@benchmark
+def call_superfunction_without_tilde() -> Callable[[], Any]:
+    function = superfunction(tilde_syntax=False, check_decorators=False)(superfunction_template_without_tilde)
+    return lambda: function(1)
+
+
+@benchmark
+def await_async_function() -> Callable[[], Any]:
+    return lambda: drive(async_function(1))
+
+
+@benchmark
+def await_superfunction() -> Callable[[], Any]:
+    function = superfunction(check_decorators=False)(superfunction_template)
+    return lambda: drive(function(1))
+
+
+@benchmark
+def iterate_generator_function() -> Callable[[], Any]:
+    return lambda: list(generator_function(1))
+
+
+@benchmark
+def iterate_superfunction() -> Callable[[], Any]:
+    function = superfunction(check_decorators=False)(superfunction_template)
+    return lambda: list(function(1))
+
+
+# Each call of a superfunction is compared with a call of the equivalent hand-written function.
+OVERHEAD_PAIRS = (
+    ('call_superfunction_with_tilde', 'call_usual_function'),
+    ('call_superfunction_without_tilde', 'call_usual_function'),
+    ('await_superfunction', 'await_async_function'),
+    ('iterate_superfunction', 'iterate_generator_function'),
+    ('iterate_long_superfunction', 'iterate_long_generator_function'),
+)
+
+
+@benchmark
+def iterate_long_generator_function() -> Callable[[], Any]:
+    return lambda: list(long_generator_function(1000))
+
+
+@benchmark
+def iterate_long_superfunction() -> Callable[[], Any]:
+    function = superfunction(check_decorators=False)(long_superfunction_template)
+    return lambda: list(function(1000))
+
+
+def measure(statement: Callable[[], Any], repeat: int, minimum_time: float) -> float:
+    timer = Timer(statement)
+    number, _ = timer.autorange()
+    number = max(number, int(number * minimum_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(names: Optional[List[str]] = None, repeat: int = 5, minimum_time: float = 0.2) -> Dict[str, float]:
+    disable_bytecode_cache()
+
+    results = {}
+    for name, create_statement in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        statement = create_statement()
+        # The first call generates the functions that are used by the statement itself, it's not what is measured.
+        statement()
+        results[name] = measure(statement, repeat, minimum_time)
+
+    return results
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = ArgumentParser(description='Micro-benchmarks of transfunctions.')
+    parser.add_argument('names', nargs='*', help='Names of benchmarks to run, all of them by default.')
+    parser.add_argument('--output', help='A JSON file to save the results to.')
+    parser.add_argument('--repeat', type=int, default=5, help='How many times each benchmark is repeated, the best result is taken.')
+    parser.add_argument('--minimum-time', type=float, default=0.2, help='The minimal duration of one repeat in seconds.')
+    parsed_arguments = parser.parse_args(arguments)
+
+    results = run(parsed_arguments.names, parsed_arguments.repeat, parsed_arguments.minimum_time)
+
+    for name, seconds in results.items():
+        sys.stdout.write(f'{name:<36} {seconds * 1e6:>12.3f} us\n')
+
+    overheads = [(name, baseline_name) for name, baseline_name in OVERHEAD_PAIRS if name in results and baseline_name in results]
+    if overheads:
+        sys.stdout.write('\nOverhead of superfunctions compared to ordinary functions:\n')
+        for name, baseline_name in overheads:
+            sys.stdout.write(f'{name:<36} {(results[name] - results[baseline_name]) * 1e6:>+12.3f} us {results[name] / results[baseline_name]:>8.2f}x\n')
+
+    if parsed_arguments.output:
+        with open(parsed_arguments.output, 'w', encoding='utf-8') as file:
+            json.dump({'python': sys.version, 'results': results}, file, indent=4)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
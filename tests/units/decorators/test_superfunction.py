@@ -1,7 +1,11 @@
+import gc
 import io
+import pickle
 import sys
-from asyncio import run
+import weakref
+from asyncio import run, sleep
 from contextlib import redirect_stdout
+from inspect import isgenerator
 
 import pytest
 from full_match import match
@@ -11,12 +15,21 @@ from transfunctions import (
     WrongMarkerSyntaxError,
     WrongTransfunctionSyntaxError,
     async_context,
+    async_generator_context,
     await_it,
+    call_sites,
     generator_context,
     superfunction,
     sync_context,
     yield_from_it,
 )
+from transfunctions.transformer import FunctionTransformer
+
+
+@superfunction
+def global_superfunction():
+    with sync_context:
+        return 1
 
 """
 Что нужно проверить:
@@ -776,3 +789,376 @@ def test_use_decorator_without_at():
 
     with pytest.raises(WrongDecoratorSyntaxError, match=match("The @superfunction decorator can only be used with the '@' symbol. Don't use it as a regular function. Also, don't rename it.")):
         list(function())
+
+
+def test_declared_contexts_are_generated_together():
+    @superfunction(contexts=('sync_context', 'generator_context'))
+    def function():
+        with sync_context:
+            return 1
+        with generator_context:
+            yield 2
+
+    assert ~function() == 1
+    assert set(function.__transformer__.cache) == {'sync_context', 'generator_context'}
+    assert list(function()) == [2]
+
+
+def test_nothing_is_compiled_while_checking_returns_without_tilde_syntax(monkeypatch):
+    def fail(*args, **kwargs):  # noqa: ARG001
+        raise AssertionError('The function must not be compiled.')
+
+    monkeypatch.setattr(FunctionTransformer, 'compile_context', fail)
+
+    @superfunction(tilde_syntax=False)
+    def function():
+        with async_context:
+            return 1
+
+    assert function.__transformer__.cache == {}
+
+
+def test_there_is_exception_if_not_tilde_mode_and_return_is_nested_in_sync_block():
+    with pytest.raises(WrongTransfunctionSyntaxError, match=match('A superfunction cannot contain a return statement.')):
+        @superfunction(tilde_syntax=False)
+        def function():
+            with generator_context:
+                yield 1
+            for number in range(3):
+                if number:
+                    with sync_context:
+                        return number
+
+
+def test_usual_function_is_generated_lazily_without_tilde_syntax():
+    @superfunction(tilde_syntax=False)
+    def function(number):
+        with sync_context:
+            numbers.append(number)
+        with async_context:
+            return number
+
+    numbers = []
+
+    assert function.__transformer__.cache == {}
+
+    function(1)
+
+    assert numbers == [1]
+    assert run(function(2)) == 2
+
+
+def test_locals_around_the_superfunction_are_not_kept_alive():
+    class SomeObject:
+        pass
+
+    def factory():
+        local_object = SomeObject()
+        local_reference = weakref.ref(local_object)
+
+        @superfunction
+        def function(number, *, addition=1):
+            return number + addition
+
+        return function, local_reference
+
+    function, reference = factory()
+    gc.collect()
+
+    assert reference() is None
+    assert ~function(1) == 2
+
+
+
+def test_usage_tracer_has_no_dict():
+    @superfunction
+    def function():
+        return 1
+
+    tracer = function()
+
+    assert not hasattr(tracer, '__dict__')
+    assert ~tracer == 1
+
+
+def test_coroutine_is_not_created_if_it_is_not_awaited(monkeypatch):
+    calls = []
+    original_get_async_function = FunctionTransformer.get_async_function
+
+    def get_async_function(self):
+        calls.append(self)
+        return original_get_async_function(self)
+
+    monkeypatch.setattr(FunctionTransformer, 'get_async_function', get_async_function)
+
+    @superfunction
+    def function():
+        with sync_context:
+            return 1
+        with async_context:
+            return 2
+        with generator_context:
+            yield 3
+
+    assert ~function() == 1
+    assert list(function()) == [3]
+    assert calls == []
+
+    assert run(function()) == 2
+    assert len(calls) == 1
+
+
+def test_await_superfunction_inside_coroutine():
+    @superfunction
+    def function(number):
+        with async_context:
+            return number * 2
+
+    async def main():
+        return await function(3)
+
+    assert run(main()) == 6
+
+
+def test_finalizers_are_not_registered(monkeypatch):
+    def fail(*args, **kwargs):  # noqa: ARG001
+        raise AssertionError('No finalizers must be registered.')
+
+    monkeypatch.setattr(weakref, 'finalize', fail)
+
+    @superfunction
+    def function():
+        with async_context:
+            return 2
+        return 1
+
+    @superfunction(tilde_syntax=False)
+    def other_function():
+        pass
+
+    assert ~function() == 1
+    assert run(function()) == 2
+    other_function()
+
+
+def test_discarded_call_without_tilde_syntax_runs_at_once():
+    numbers = []
+
+    @superfunction(tilde_syntax=False)
+    def function(number):
+        numbers.append(number)
+
+    gc.disable()
+    try:
+        function(1)
+        assert numbers == [1]
+        function(2)
+        assert numbers == [1, 2]
+    finally:
+        gc.enable()
+
+
+def test_exception_from_discarded_call_without_tilde_syntax_is_raised_to_caller():
+    @superfunction(tilde_syntax=False)
+    def function():
+        raise ValueError('kek')
+
+    with pytest.raises(ValueError, match='kek'):
+        function()
+
+
+def test_awaited_call_gets_coroutine_directly():
+    @superfunction
+    def function():
+        with async_context:
+            return 1
+
+    async def main():
+        return await function()
+
+    assert run(main()) == 1
+
+
+def test_iterated_call_gets_generator_directly():
+    @superfunction
+    def function():
+        with generator_context:
+            yield 1
+            yield 2
+
+    results = []
+    for number in function():
+        results.append(number)
+
+    assert results == [1, 2]
+
+
+def test_call_from_c_code_without_tilde_syntax_is_not_taken_for_iteration():
+    @superfunction(tilde_syntax=False)
+    def function(number):
+        with sync_context:
+            numbers.append(number)
+        with generator_context:
+            yield number
+
+    numbers = []
+
+    for _ in list(map(function, [1, 2])):
+        pass
+
+    del _
+    gc.collect()
+
+    assert numbers == [1, 2]
+
+
+def test_call_from_c_code_with_tilde_syntax_is_not_taken_for_iteration():
+    @superfunction
+    def function(number):
+        with sync_context:
+            return number * 2
+        with generator_context:
+            yield number
+
+    results = []
+    for result in list(map(function, [1, 2])):
+        results.append(~result)
+
+    assert results == [2, 4]
+
+
+def test_call_site_is_inspected_once(monkeypatch):
+    detections = []
+    original_detect_call_site_mode = call_sites.detect_call_site_mode
+
+    def counting_detect_call_site_mode(code, offset, function_name):
+        detections.append(offset)
+        return original_detect_call_site_mode(code, offset, function_name)
+
+    monkeypatch.setattr(call_sites, 'detect_call_site_mode', counting_detect_call_site_mode)
+
+    @superfunction(tilde_syntax=False)
+    def function(number):
+        with sync_context:
+            numbers.append(number)
+        with async_context:
+            return number
+
+    numbers = []
+
+    for number in range(5):
+        function(number)
+
+    assert numbers == [0, 1, 2, 3, 4]
+    assert len(detections) == 1
+
+
+def test_iteration_returns_generator_itself():
+    @superfunction
+    def function():
+        with generator_context:
+            yield 1
+
+    tracer = function()
+    generator = iter(tracer)
+
+    assert isgenerator(generator)
+    assert generator.gi_code is function.__transformer__.get_generator_function().__code__
+    assert list(generator) == [1]
+
+
+def test_send_throw_and_close_go_to_generator():
+    events = []
+
+    @superfunction
+    def function():
+        with generator_context:
+            try:
+                while True:
+                    received = yield len(events)
+                    events.append(received)
+            except ValueError as e:
+                events.append(str(e))
+                yield -1
+            finally:
+                events.append('closed')
+
+    generator = iter(function())
+
+    assert next(generator) == 0
+    assert generator.send('first') == 1
+    assert generator.send('second') == 2
+    assert generator.throw(ValueError('kek')) == -1
+
+    generator.close()
+
+    assert events == ['first', 'second', 'kek', 'closed']
+
+
+def test_yield_from_superfunction_delegates_send():
+    received = []
+
+    @superfunction
+    def function():
+        with generator_context:
+            received.append((yield 1))
+            received.append((yield 2))
+
+    def outer():
+        tracer = function()
+        yield from tracer
+
+    generator = outer()
+
+    assert next(generator) == 1
+    assert generator.send('a') == 2
+    with pytest.raises(StopIteration):
+        generator.send('b')
+
+    assert received == ['a', 'b']
+
+
+def test_async_for_superfunction():
+    @superfunction
+    def function(number):
+        with sync_context:
+            print(1)  # noqa: T201
+        with async_generator_context:
+            for index in range(number):
+                yield await_it(sleep(0, result=index))
+
+    async def collect():
+        return [number async for number in function(3)]
+
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        numbers = run(collect())
+
+    assert buffer.getvalue() == ""
+    assert numbers == [0, 1, 2]
+
+
+def test_async_for_superfunction_through_tracer():
+    produced = []
+
+    @superfunction
+    def function():
+        with async_generator_context:
+            for index in range(3):
+                produced.append(index)
+                yield index
+
+    async def take_first():
+        tracer = function()
+        async for number in tracer:
+            return number, list(produced)
+
+    # The values are produced by request, so the loop that stops after the first value gets only it.
+    assert run(take_first()) == (0, [0])
+
+
+def test_generated_functions_of_superfunction_are_pickled_by_reference():
+    function = global_superfunction.__transformer__.get_usual_function()
+
+    assert function.__qualname__ == 'global_superfunction.__transformer__.variants.sync_context'
+    assert pickle.loads(pickle.dumps(function)) is function
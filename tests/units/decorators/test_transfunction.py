@@ -1,7 +1,25 @@
+import ast
+import builtins
+import gc
+import pickle
 import traceback
-from asyncio import run
+import weakref
+from asyncio import gather, run
+from asyncio import sleep as async_sleep
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import contextmanager
-from inspect import getsourcelines, iscoroutinefunction, isfunction, isgeneratorfunction
+from contextvars import ContextVar
+from inspect import (
+    getsourcelines,
+    isasyncgenfunction,
+    iscoroutinefunction,
+    isfunction,
+    isgeneratorfunction,
+    signature,
+)
+from multiprocessing import Pool
+from threading import Barrier, Thread, get_ident
+from time import sleep
 
 import pytest
 from full_match import match
@@ -12,16 +30,41 @@ from transfunctions import (
     WrongDecoratorSyntaxError,
     WrongMarkerSyntaxError,
     async_context,
+    async_generator_context,
     await_it,
+    gather_it,
     generator_context,
+    is_async,
+    is_generator,
+    map_it,
     sync_context,
     transfunction,
     yield_from_it,
 )
+from transfunctions import transformer as transformer_module
 from transfunctions.transformer import FunctionTransformer
 
 SOME_GLOBAL = 777
 
+
+@transfunction
+def global_template(number, power=2):
+    with sync_context:
+        return number ** power
+    with async_context:
+        return -number
+    with generator_context:
+        yield number
+
+
+class GlobalClass:
+    def __init__(self, addition):
+        self.addition = addition
+
+    @transfunction
+    def template(self, number):
+        return number + self.addition
+
 """
 Что нужно проверить:
 
@@ -1557,3 +1600,1102 @@ def test_use_decorator_without_at():
 
     with pytest.raises(WrongDecoratorSyntaxError, match=match("The @transfunction decorator can only be used with the '@' symbol. Don't use it as a regular function. Also, don't rename it.")):
         template.get_generator_function()
+
+
+def test_source_code_is_read_and_parsed_once_for_all_types_of_functions(monkeypatch):
+    load_calls = []
+    parse_calls = []
+    original_load_source_code = FunctionTransformer.load_source_code
+    original_parse_source_code = FunctionTransformer.parse_source_code
+
+    def counting_load_source_code(self):
+        load_calls.append(self)
+        return original_load_source_code(self)
+
+    def counting_parse_source_code(self, source_code):
+        parse_calls.append(source_code)
+        return original_parse_source_code(self, source_code)
+
+    monkeypatch.setattr(FunctionTransformer, 'load_source_code', counting_load_source_code)
+    monkeypatch.setattr(FunctionTransformer, 'parse_source_code', counting_parse_source_code)
+
+    @transfunction
+    def template(number):
+        with sync_context:
+            return number
+        with async_context:
+            return number + 1
+        with generator_context:
+            yield number + 2
+
+    assert template.get_usual_function()(1) == 1
+    assert run(template.get_async_function()(1)) == 2
+    assert list(template.get_generator_function()(1)) == [3]
+
+    assert len(load_calls) == 1
+    assert len(parse_calls) == 0
+
+
+def test_template_tree_is_not_changed_by_generation():
+    @transfunction
+    def template():
+        with sync_context:
+            return 1
+        with async_context:
+            return 2
+
+    template.get_usual_function()
+    tree_dump = ast.dump(template.template_tree)
+    template.get_async_function()
+
+    assert ast.dump(template.template_tree) == tree_dump
+
+
+def test_copy_tree():
+    tree = ast.parse('def function(a, b=1):\n    return [a, b, (a + b)]')
+
+    copied_tree = FunctionTransformer.copy_tree(tree)
+
+    assert copied_tree is not tree
+    assert copied_tree.body[0] is not tree.body[0]
+    assert copied_tree.body[0].body is not tree.body[0].body
+    assert ast.dump(copied_tree, include_attributes=True) == ast.dump(tree, include_attributes=True)
+
+
+def test_declared_contexts_are_generated_together():
+    @transfunction(contexts=('sync_context', 'async_context'))
+    def template():
+        with sync_context:
+            return 1
+        with async_context:
+            return 2
+
+    assert template.contexts == ('sync_context', 'async_context')
+    assert template.cache == {}
+
+    assert template.get_usual_function()() == 1
+
+    assert set(template.cache) == {'sync_context', 'async_context'}
+    assert run(template.get_async_function()()) == 2
+
+
+def test_error_in_declared_context_is_raised_only_for_this_context():
+    @transfunction(contexts=('sync_context', 'async_context'))
+    def template():
+        with sync_context:
+            return 1
+        with async_context:
+            return await_it(1, 2)
+
+    assert template.get_usual_function()() == 1
+    assert template.get_usual_function()() == 1
+    assert set(template.cache) == {'sync_context'}
+
+    for _ in range(2):
+        with pytest.raises(WrongMarkerSyntaxError, match=match('The "await_it" marker can be used with only one positional argument.')):
+            template.get_async_function()
+
+
+def test_not_declared_context_is_generated_separately():
+    @transfunction(contexts=['sync_context'])
+    def template():
+        yield 1
+
+    assert list(template.get_generator_function()()) == [1]
+
+    assert set(template.cache) == {'generator_context'}
+
+
+def test_unknown_context():
+    with pytest.raises(ValueError, match=match('Unknown context "kek_context". Use one of: sync_context, async_context, generator_context, async_generator_context.')):
+        @transfunction(contexts=('sync_context', 'kek_context'))
+        def template():
+            pass
+
+
+def test_create_async_generator_function():
+    @transfunction
+    def template(number):
+        with sync_context:
+            return number
+        with async_context:
+            return await_it(some_async_function(number))
+        with async_generator_context:
+            for index in range(number):
+                yield await_it(some_async_function(index))
+
+    async def some_async_function(number):
+        return number * 2
+
+    async def collect():
+        return [item async for item in function(3)]
+
+    function = template.get_async_generator_function()
+
+    assert isasyncgenfunction(function)
+    assert function is template.get_async_generator_function()
+    assert run(collect()) == [0, 2, 4]
+    assert template.get_usual_function()(3) == 3
+    assert run(template.get_async_function()(3)) == 6
+
+
+def test_async_generator_context_is_cut_from_other_functions():
+    @transfunction
+    def template():
+        with generator_context:
+            yield 1
+        with async_generator_context:
+            yield 2
+
+    async def collect():
+        return [item async for item in template.get_async_generator_function()()]
+
+    assert list(template.get_generator_function()()) == [1]
+    assert run(collect()) == [2]
+
+
+def test_yield_from_it_in_async_generator_context():
+    @transfunction
+    def template():
+        with generator_context:
+            yield_from_it([1, 2])
+        with async_generator_context:
+            print(yield_from_it([1, 2]))  # noqa: T201
+
+    assert list(template.get_generator_function()()) == [1, 2]
+
+    with pytest.raises(WrongMarkerSyntaxError, match=match('The "yield_from_it" marker can\'t be used in an async generator, because "yield from" is not allowed there. Use a loop with "yield" instead.')):
+        template.get_async_generator_function()
+
+
+def count_compilations(monkeypatch, delay=0.0):
+    compiled_contexts = []
+    original_compile_context = FunctionTransformer.compile_context
+
+    def counting_compile_context(self, context_name, addictional_transformers):
+        compiled_contexts.append(context_name)
+        sleep(delay)
+        return original_compile_context(self, context_name, addictional_transformers)
+
+    monkeypatch.setattr(FunctionTransformer, 'compile_context', counting_compile_context)
+
+    return compiled_contexts
+
+
+def test_function_is_compiled_once_for_concurrent_calls(monkeypatch):
+    compiled_contexts = count_compilations(monkeypatch, delay=0.05)
+    number_of_threads = 8
+    barrier = Barrier(number_of_threads)
+    results = []
+
+    @transfunction
+    def template():
+        return 1
+
+    def get_function():
+        barrier.wait()
+        results.append(template.get_usual_function())
+
+    threads = [Thread(target=get_function) for _ in range(number_of_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert compiled_contexts == ['sync_context']
+    assert len(results) == number_of_threads
+    assert all(result is results[0] for result in results)
+
+
+def test_declared_contexts_are_compiled_once_for_concurrent_calls(monkeypatch):
+    compiled_contexts = count_compilations(monkeypatch, delay=0.05)
+    barrier = Barrier(4)
+
+    @transfunction(contexts=('sync_context', 'async_context'))
+    def template():
+        return 1
+
+    def get_function(getter):
+        barrier.wait()
+        getter()
+
+    threads = [Thread(target=get_function, args=(getter,)) for getter in (template.get_usual_function, template.get_async_function) * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(compiled_contexts) == ['async_context', 'sync_context']
+
+
+def test_failed_compilation_is_not_cached(monkeypatch):
+    calls = []
+    original_compile_context = FunctionTransformer.compile_context
+
+    def failing_once_compile_context(self, context_name, addictional_transformers):
+        calls.append(context_name)
+        if len(calls) == 1:
+            raise RuntimeError('kek')
+        return original_compile_context(self, context_name, addictional_transformers)
+
+    monkeypatch.setattr(FunctionTransformer, 'compile_context', failing_once_compile_context)
+
+    @transfunction
+    def template():
+        return 1
+
+    with pytest.raises(RuntimeError, match='kek'):
+        template.get_usual_function()
+
+    assert template.get_usual_function()() == 1
+    assert len(calls) == 2
+
+
+def test_methods_are_bound_to_their_own_instances(monkeypatch):
+    compiled_contexts = count_compilations(monkeypatch)
+
+    class SomeClass:
+        def __init__(self, value):
+            self.value = value
+
+        @transfunction
+        def template(self, addition):
+            with sync_context:
+                return self.value + addition
+            with async_context:
+                return self.value - addition
+            with generator_context:
+                yield self.value * addition
+
+    first_instance = SomeClass(10)
+    second_instance = SomeClass(20)
+
+    assert first_instance.template.get_usual_function()(1) == 11
+    assert second_instance.template.get_usual_function()(1) == 21
+    assert first_instance.template.get_usual_function()(2) == 12
+    assert run(second_instance.template.get_async_function()(1)) == 19
+    assert run(first_instance.template.get_async_function()(1)) == 9
+    assert list(first_instance.template.get_generator_function()(2)) == [20]
+    assert list(second_instance.template.get_generator_function()(2)) == [40]
+
+    assert sorted(compiled_contexts) == ['async_context', 'generator_context', 'sync_context']
+
+
+def test_unbound_functions_are_cached():
+    class SomeClass:
+        @transfunction
+        def template(self):
+            return self
+
+    instance = SomeClass()
+    method = instance.template.get_usual_function()
+
+    assert method() is instance
+    assert method.__self__ is instance
+    assert SomeClass.template.cache['sync_context'] is method.__func__
+    assert SomeClass.template.get_usual_function()(instance) is instance
+
+
+def test_access_through_class_returns_the_transformer_itself():
+    class SomeClass:
+        @transfunction
+        def template(self):
+            pass
+
+    instance = SomeClass()
+
+    assert SomeClass.template is SomeClass.__dict__['template']
+    assert instance.template is not SomeClass.template
+    assert instance.template.function is SomeClass.template.function
+    assert SomeClass.template.base_object is None
+
+
+def test_instances_are_not_kept_alive_by_transformer():
+    class SomeClass:
+        @transfunction
+        def template(self):
+            return 1
+
+    instance = SomeClass()
+    assert instance.template.get_usual_function()() == 1
+
+    reference = weakref.ref(instance)
+    del instance
+    gc.collect()
+
+    assert reference() is None
+
+
+def test_locals_around_the_template_are_not_kept_alive():
+    class SomeObject:
+        pass
+
+    def factory():
+        local_object = SomeObject()
+        local_reference = weakref.ref(local_object)
+
+        @transfunction
+        def template(number=5):
+            with sync_context:
+                return number
+            with async_context:
+                return number + 1
+
+        return template, local_reference
+
+    template, reference = factory()
+    gc.collect()
+
+    assert reference() is None
+    assert template.get_usual_function()() == 5
+    assert run(template.get_async_function()(1)) == 2
+
+
+def test_defaults_and_annotations_from_enclosing_scope():
+    def factory():
+        default = [1, 2]
+        keyword_default = 'kek'
+        annotation = int
+
+        @transfunction
+        def template(first: annotation = default, *, second: annotation = keyword_default) -> annotation:
+            with sync_context:
+                return first, second
+            with async_context:
+                return second, first
+
+        return template, default
+
+    template, default = factory()
+    function = template.get_usual_function()
+
+    assert function() == (default, 'kek')
+    assert function()[0] is default
+    assert run(template.get_async_function()()) == ('kek', default)
+    assert function.__annotations__ == {'first': int, 'second': int, 'return': int}
+    assert function.__kwdefaults__ == {'second': 'kek'}
+
+
+def test_functions_are_created_without_exec(monkeypatch):
+    def fail(*args, **kwargs):  # noqa: ARG001
+        raise AssertionError('The code must not be executed.')
+
+    monkeypatch.setattr(builtins, 'exec', fail)
+
+    @transfunction
+    def template(number):
+        with sync_context:
+            return number
+        with async_context:
+            return number + 1
+
+    assert template.get_usual_function()(1) == 1
+    assert run(template.get_async_function()(1)) == 2
+
+
+def test_closure_cells_are_shared_with_template():
+    first = 1
+    second = 2
+
+    @transfunction
+    def template():
+        return first + second
+
+    function = template.get_usual_function()
+    closure = dict(zip(template.function.__code__.co_freevars, template.function.__closure__))
+
+    assert function() == 3
+    assert function.__code__.co_freevars == ('first', 'second')
+    assert all(cell is closure[name] for name, cell in zip(function.__code__.co_freevars, function.__closure__))
+
+    second = 5
+
+    assert function() == 6
+    assert function.__globals__ is template.function.__globals__
+
+
+def test_code_is_shared_between_templates_from_the_same_definition(monkeypatch):
+    compiled_contexts = count_compilations(monkeypatch)
+
+    def factory(number):
+        @transfunction
+        def template(addition=number):
+            with sync_context:
+                return number + addition
+            with async_context:
+                return number - addition
+
+        return template
+
+    first_template = factory(1)
+    second_template = factory(10)
+
+    assert first_template is not second_template
+    assert first_template.get_usual_function()() == 2
+    assert second_template.get_usual_function()() == 20
+    assert second_template.get_usual_function()(5) == 15
+    assert run(first_template.get_async_function()(3)) == -2
+    assert run(second_template.get_async_function()(3)) == 7
+
+    assert compiled_contexts == ['sync_context', 'async_context']
+    assert first_template.get_usual_function().__code__ is second_template.get_usual_function().__code__
+
+
+def test_code_is_not_shared_between_different_definitions(monkeypatch):
+    compiled_contexts = count_compilations(monkeypatch)
+
+    @transfunction
+    def first_template():
+        return 1
+
+    @transfunction
+    def second_template():
+        return 1
+
+    assert first_template.get_usual_function()() == 1
+    assert second_template.get_usual_function()() == 1
+
+    assert compiled_contexts == ['sync_context', 'sync_context']
+
+
+def test_shared_code_of_another_template_is_not_used(monkeypatch):
+    compiled_contexts = count_compilations(monkeypatch)
+    shared_code_cache = {}
+    monkeypatch.setattr(transformer_module, 'shared_code_cache', shared_code_cache)
+
+    def factory():
+        @transfunction
+        def template():
+            return 1
+
+        return template
+
+    assert factory().get_usual_function()() == 1
+
+    # It's what happens when the module is changed and reloaded, the definition is in the same place, but the code is different.
+    [(key, (_, code))] = shared_code_cache.items()
+    shared_code_cache[key] = ((lambda: None).__code__, code)
+
+    assert factory().get_usual_function()() == 1
+    assert compiled_contexts == ['sync_context', 'sync_context']
+
+
+def test_offloaded_async_function_runs_usual_function_in_thread():
+    @transfunction
+    def template(number, multiplier=2):
+        with sync_context:
+            return number * multiplier, get_ident()
+        with async_context:
+            return None
+
+    function = template.get_offloaded_async_function()
+
+    assert iscoroutinefunction(function)
+    assert function.__name__ == 'template'
+
+    result, thread_id = run(function(3))
+
+    assert result == 6
+    assert thread_id != get_ident()
+    assert run(function(3, multiplier=3))[0] == 9
+
+
+def test_offloaded_async_function_uses_given_executor():
+    @transfunction
+    def template():
+        return get_ident()
+
+    def get_executor_thread_id():
+        return get_ident()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor_thread_id = executor.submit(get_executor_thread_id).result()
+
+        assert run(template.get_offloaded_async_function(executor)()) == executor_thread_id
+
+
+def test_offloaded_async_function_propagates_context_variables():
+    variable = ContextVar('variable')
+
+    @transfunction
+    def template():
+        return variable.get()
+
+    async def main():
+        variable.set('kek')
+        return await template.get_offloaded_async_function()()
+
+    assert run(main()) == 'kek'
+
+
+def test_offloaded_async_function_doesnt_block_event_loop():
+    events = []
+
+    @transfunction
+    def template():
+        sleep(0.1)
+        events.append('blocking')
+
+    async def ticker():
+        await async_sleep(0.01)
+        events.append('tick')
+
+    async def main():
+        await gather(template.get_offloaded_async_function()(), ticker())
+
+    run(main())
+
+    assert events == ['tick', 'blocking']
+
+
+def test_offloaded_async_function_from_method():
+    class SomeClass:
+        some_value = 1
+        @transfunction
+        def template(self, a):
+            return self.some_value + a
+
+    assert run(SomeClass().template.get_offloaded_async_function()(2)) == 3
+
+
+def test_generated_functions_are_pickled_by_reference():
+    for context_name in ('sync_context', 'async_context', 'generator_context'):
+        function = global_template.extract_context(context_name)
+
+        assert function.__qualname__ == f'global_template.variants.{context_name}'
+        assert pickle.loads(pickle.dumps(function)) is function
+
+    assert pickle.loads(pickle.dumps(GlobalClass.template.get_usual_function())) is GlobalClass.template.get_usual_function()
+
+
+def test_variants():
+    assert global_template.variants.sync_context is global_template.get_usual_function()
+    assert global_template.variants.generator_context is global_template.get_generator_function()
+
+    with pytest.raises(AttributeError, match=match('Unknown context "kek_context". Use one of: sync_context, async_context, generator_context, async_generator_context.')):
+        global_template.variants.kek_context  # noqa: B018
+
+
+def test_process_pool_function_with_executor():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        function = global_template.get_process_pool_function(executor, chunksize=2)
+
+        assert function([(1,), (2,), (3,), (2, 3)]) == [1, 4, 9, 8]
+        assert function([]) == []
+
+
+def test_process_pool_function_with_multiprocessing_pool():
+    with Pool(2) as pool:
+        assert global_template.get_process_pool_function(pool)([(index,) for index in range(5)]) == [0, 1, 4, 9, 16]
+
+
+def test_process_pool_function_from_method():
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert GlobalClass(10).template.get_process_pool_function(executor)([(1,), (2,)]) == [11, 12]
+
+
+def test_gather_it_awaits_concurrently_in_async_function():
+    events = []
+
+    async def fetch(number, delay):
+        events.append(('start', number))
+        await async_sleep(delay)
+        events.append(('finish', number))
+        return number
+
+    @transfunction
+    def template():
+        with sync_context:
+            return gather_it(1, 2)
+        with async_context:
+            return gather_it(fetch(1, 0.02), fetch(2, 0.01))
+
+    assert run(template.get_async_function()()) == [1, 2]
+    assert events == [('start', 1), ('start', 2), ('finish', 2), ('finish', 1)]
+
+
+def test_gather_it_with_starred_arguments_in_async_function():
+    async def fetch(number):
+        return number * 2
+
+    @transfunction
+    def template(numbers):
+        return gather_it(*[fetch(number) for number in numbers])
+
+    assert run(template.get_async_function()([1, 2, 3])) == [2, 4, 6]
+
+
+def test_gather_it_in_async_generator_function():
+    async def fetch(number):
+        return number
+
+    @transfunction
+    def template():
+        yield gather_it(fetch(1), fetch(2))
+
+    async def collect():
+        return [item async for item in template.get_async_generator_function()()]
+
+    assert run(collect()) == [[1, 2]]
+
+
+def test_gather_it_evaluates_sequentially_in_usual_and_generator_functions():
+    calls = []
+
+    def fetch(number):
+        calls.append((number, get_ident()))
+        return number
+
+    @transfunction
+    def template():
+        with sync_context:
+            return gather_it(fetch(1), fetch(2), fetch(3))
+        with generator_context:
+            yield gather_it(fetch(4), in_threads=False)
+
+    assert template.get_usual_function()() == [1, 2, 3]
+    assert list(template.get_generator_function()()) == [[4]]
+    assert calls == [(number, get_ident()) for number in range(1, 5)]
+
+
+def test_gather_it_in_threads_in_usual_function():
+    barrier = Barrier(3, timeout=5)
+
+    def fetch(number):
+        # It can pass the barrier only if all three calls are executed at the same time.
+        barrier.wait()
+        return number, get_ident()
+
+    @transfunction
+    def template(number):
+        return gather_it(fetch(number), fetch(number + 1), fetch(number + 2), in_threads=True)
+
+    results = template.get_usual_function()(1)
+
+    assert [number for number, _ in results] == [1, 2, 3]
+    assert len({thread_id for _, thread_id in results}) == 3
+    assert get_ident() not in {thread_id for _, thread_id in results}
+
+
+def test_gather_it_in_threads_without_arguments():
+    @transfunction
+    def template():
+        return gather_it(in_threads=True)
+
+    assert template.get_usual_function()() == []
+
+
+def test_gather_it_with_wrong_keywords():
+    flag = True
+
+    @transfunction
+    def first_template():
+        return gather_it(1, kek=True)
+
+    @transfunction
+    def second_template():
+        return gather_it(1, in_threads=1)
+
+    @transfunction
+    def third_template():
+        return gather_it(1, in_threads=flag)
+
+    for template in (first_template, second_template, third_template):
+        with pytest.raises(WrongMarkerSyntaxError, match=match('The "gather_it" marker accepts only positional arguments and the "in_threads" flag, which should be True or False.')):
+            template.get_usual_function()
+
+
+def test_gather_it_in_threads_with_starred_arguments():
+    @transfunction
+    def template(numbers):
+        return gather_it(*numbers, in_threads=True)
+
+    with pytest.raises(WrongMarkerSyntaxError, match=match('The "gather_it" marker with in_threads=True can\'t be used with starred arguments.')):
+        template.get_usual_function()
+
+
+def test_map_it_in_all_types_of_functions():
+    async def fetch_async(number):
+        await async_sleep(0.001 * (5 - number))
+        return number * 2
+
+    def fetch(number):
+        return number * 2
+
+    @transfunction
+    def template(numbers):
+        with sync_context:
+            return map_it(fetch, numbers, limit=2)
+        with async_context:
+            return map_it(fetch_async, numbers, limit=2)
+        with async_generator_context:
+            yield map_it(fetch_async, numbers)
+        with generator_context:
+            yield_from_it(map_it(fetch, numbers, limit=2))
+
+    async def collect():
+        return [item async for item in template.get_async_generator_function()(range(3))]
+
+    assert template.get_usual_function()(range(5)) == [0, 2, 4, 6, 8]
+    assert run(template.get_async_function()(range(5))) == [0, 2, 4, 6, 8]
+    assert list(template.get_generator_function()(range(5))) == [0, 2, 4, 6, 8]
+    assert run(collect()) == [[0, 2, 4]]
+
+
+def test_map_it_in_generator_function_is_lazy():
+    calls = []
+
+    def fetch(number):
+        calls.append(number)
+        return number
+
+    @transfunction
+    def template():
+        yield_from_it(map_it(fetch, range(100)))
+
+    generator = template.get_generator_function()()
+
+    assert next(generator) == 0
+    assert calls == [0]
+
+
+def test_map_it_without_limit_in_usual_function():
+    @transfunction
+    def template(numbers):
+        return map_it(str, numbers)
+
+    assert template.get_usual_function()([1, 2]) == ['1', '2']
+
+
+def test_map_it_with_wrong_arguments():
+    @transfunction
+    def first_template():
+        return map_it(str)
+
+    @transfunction
+    def second_template(numbers):
+        return map_it(str, numbers, 5)
+
+    @transfunction
+    def third_template(numbers):
+        return map_it(str, numbers, kek=5)
+
+    @transfunction
+    def fourth_template(numbers):
+        return map_it(*numbers)
+
+    for template in (first_template, second_template, third_template, fourth_template):
+        with pytest.raises(WrongMarkerSyntaxError, match=match('The "map_it" marker can be used with a function, an iterable and an optional "limit" keyword argument.')):
+            template.get_usual_function()
+
+
+def get_used_constants(function):
+    return {constant for constant in function.__code__.co_consts if isinstance(constant, str)}
+
+
+def test_constants_are_folded():
+    @transfunction(constants={'DEBUG': False, 'BACKEND': 'fast'})
+    def template(number):
+        if DEBUG:  # noqa: F821
+            print('debug')  # noqa: T201
+        if BACKEND == 'slow':  # noqa: F821
+            return 'slow'
+        elif BACKEND == 'fast':  # noqa: F821, RET505
+            return 'fast' if not DEBUG else 'fast with debug'  # noqa: F821
+        else:
+            return number
+
+    function = template.get_usual_function()
+
+    assert function(1) == 'fast'
+    assert get_used_constants(function) == {'fast'}
+
+
+def test_if_without_else_with_false_condition_is_removed():
+    @transfunction(constants={'DEBUG': False})
+    def template():
+        if DEBUG:  # noqa: F821
+            return 'debug'
+
+    function = template.get_usual_function()
+
+    assert function() is None
+    assert get_used_constants(function) == set()
+
+
+def test_generators_stay_generators_without_yields_in_folded_branches():
+    @transfunction(constants={'DEBUG': False})
+    def template(number):
+        with generator_context:
+            if DEBUG:  # noqa: F821
+                yield_from_it([number])
+        with async_generator_context:
+            if DEBUG:  # noqa: F821
+                yield number
+
+    async def collect():
+        return [number async for number in template.get_async_generator_function()(1)]
+
+    assert isgeneratorfunction(template.get_generator_function())
+    assert list(template.get_generator_function()(1)) == []
+    assert isasyncgenfunction(template.get_async_generator_function())
+    assert run(collect()) == []
+
+
+def test_not_constant_conditions_are_kept():
+    @transfunction(constants={'DEBUG': True})
+    def template(flag):
+        if flag and DEBUG:  # noqa: F821
+            return 'both'
+        if DEBUG and flag:  # noqa: F821
+            return 'unreachable'
+        return 'nothing'
+
+    assert template.get_usual_function()(True) == 'both'
+    assert template.get_usual_function()(False) == 'nothing'
+
+
+def test_bool_operations_with_constants_at_the_beginning():
+    @transfunction(constants={'ENABLED': False, 'DISABLED': True})
+    def template(flag):
+        return ENABLED and flag, DISABLED or flag, (not ENABLED) and flag  # noqa: F821
+
+    function = template.get_usual_function()
+
+    assert function('kek') == (False, True, 'kek')
+    assert function(0) == (False, True, 0)
+
+
+def test_errors_in_constant_expressions_are_left_to_runtime():
+    @transfunction(constants={'DIVIDER': 0})
+    def template():
+        if 1 / DIVIDER:  # noqa: F821
+            return 1
+        return 2
+
+    with pytest.raises(ZeroDivisionError):
+        template.get_usual_function()()
+
+
+def test_arithmetic_in_constant_expressions_is_left_to_runtime():
+    @transfunction(constants={'N': 10})
+    def template(flag):
+        if flag and N ** N ** N > 0:  # noqa: F821
+            return 1
+        return 2
+
+    assert template.get_usual_function()(False) == 2
+
+
+def test_predicates_are_folded():
+    @transfunction
+    def template():
+        if is_async():
+            return await_it(some_async_function())
+        elif is_generator():
+            yield 'generator'
+        else:
+            return 'usual' if not is_generator() else 'kek'
+
+    async def some_async_function():
+        return 'async'
+
+    assert template.get_usual_function()() == 'usual'
+    assert run(template.get_async_function()()) == 'async'
+    assert list(template.get_generator_function()()) == ['generator']
+    assert not isgeneratorfunction(template.get_usual_function())
+
+
+def test_predicates_with_arguments():
+    @transfunction
+    def template():
+        return is_async(1)
+
+    with pytest.raises(WrongMarkerSyntaxError, match=match('The "is_async" marker can be used only without arguments.')):
+        template.get_usual_function()
+
+
+def test_wrong_constants():
+    with pytest.raises(ValueError, match=match('The value of the constant "DEBUG" can\'t be embedded into the code: []. Use None, booleans, numbers, strings, bytes or tuples of them.')):
+        @transfunction(constants={'DEBUG': []})
+        def template():
+            pass
+
+    with pytest.raises(ValueError, match=match("The name of a constant must be a valid identifier, not 'kek kek'.")):
+        @transfunction(constants={'kek kek': 1})
+        def other_template():
+            pass
+
+
+def test_constants_with_names_of_arguments_and_variables():
+    @transfunction(constants={'DEBUG': True})
+    def argument_template(DEBUG=False):  # noqa: N803
+        return DEBUG
+
+    @transfunction(constants={'DEBUG': True})
+    def assignment_template():
+        DEBUG = False  # noqa: N806
+        return not DEBUG
+
+    @transfunction(constants={'DEBUG': True})
+    def loop_template():
+        for DEBUG in (False,):  # noqa: N806, B007
+            pass
+        return [DEBUG for DEBUG in (False,)]
+
+    @transfunction(constants={'DEBUG': True})
+    def nested_definition_template():
+        def DEBUG():  # noqa: N802
+            return False
+        return DEBUG
+
+    @transfunction(constants={'DEBUG': True})
+    def import_template():
+        from os import path as DEBUG  # noqa: N812
+        return DEBUG
+
+    for template in (argument_template, assignment_template, loop_template, nested_definition_template, import_template):
+        with pytest.raises(ValueError, match=match('The constant "DEBUG" is also used as the name of an argument or a variable in the template. Rename one of them.')):
+            template.get_usual_function()
+
+
+def test_tuple_constant():
+    @transfunction(constants={'BACKENDS': ('fast', (1, None))})
+    def template(backend):
+        return backend in BACKENDS  # noqa: F821
+
+    assert template.get_usual_function()('fast')
+    assert not template.get_usual_function()('slow')
+
+
+def test_code_is_not_shared_between_templates_with_different_constants(monkeypatch):
+    compiled_contexts = count_compilations(monkeypatch)
+
+    def factory(debug):
+        @transfunction(constants={'DEBUG': debug})
+        def template():
+            return DEBUG  # noqa: F821
+
+        return template
+
+    assert factory(True).get_usual_function()() is True
+    assert factory(False).get_usual_function()() is False
+    assert factory(True).get_usual_function()() is True
+    assert compiled_contexts == ['sync_context', 'sync_context']
+
+
+def test_specialized_function():
+    @transfunction
+    def template(data, mode='lenient', *, strict_length=10):
+        if mode == 'strict':
+            return data[:strict_length]
+        return data
+
+    function = template.get_specialized_function('sync_context', mode='strict')
+
+    assert function('kek' * 10) == ('kek' * 10)[:10]
+    assert function('kek' * 10, strict_length=2) == 'ke'
+    assert str(signature(function)) == '(data, *, strict_length=10)'
+    assert get_used_constants(function) == set()
+    assert template.get_specialized_function('sync_context', mode='lenient')('kek' * 10) == 'kek' * 10
+
+
+def test_specialized_functions_of_other_types():
+    @transfunction
+    def template(number, double):
+        with sync_context:
+            return number * 2 if double else number
+        with async_context:
+            return (number * 2 if double else number) + await_it(some_async_function())
+        with generator_context:
+            yield number * 2 if double else number
+
+    async def some_async_function():
+        return 100
+
+    assert run(template.get_specialized_function('async_context', double=True)(1)) == 102
+    assert list(template.get_specialized_function('generator_context', double=False)(1)) == [1]
+    assert template.get_specialized_function('sync_context', number=5, double=True)() == 10
+
+
+def test_specialized_function_from_method():
+    class SomeClass:
+        addition = 1
+
+        @transfunction
+        def template(self, number, double):
+            return (number * 2 if double else number) + self.addition
+
+    some_object = SomeClass()
+
+    assert some_object.template.get_specialized_function('sync_context', double=True)(2) == 5
+    assert some_object.template.get_specialized_function('sync_context', number=3, double=False)() == 4
+
+
+def test_specialized_functions_have_own_names_and_are_not_pickled():
+    square = global_template.get_specialized_function('sync_context', power=2)
+    cube = global_template.get_specialized_function('sync_context', power=3)
+
+    assert square.__qualname__ == 'global_template.variants.sync_context[power=2]'
+    assert cube.__qualname__ == 'global_template.variants.sync_context[power=3]'
+    assert global_template.get_usual_function().__qualname__ == 'global_template.variants.sync_context'
+
+    for function in (square, cube):
+        with pytest.raises(pickle.PicklingError):
+            pickle.dumps(function)
+
+
+def test_specialized_functions_cache():
+    @transfunction(max_specializations=2)
+    def template(mode):
+        return mode
+
+    first = template.get_specialized_function('sync_context', mode='a')
+    assert template.get_specialized_function('sync_context', mode='a') is first
+    template.get_specialized_function('sync_context', mode='b')
+    template.get_specialized_function('sync_context', mode='a')
+    template.get_specialized_function('sync_context', mode='c')
+
+    assert template.specialization_stats == {'hits': 2, 'misses': 3, 'evictions': 1}
+    assert [key for _, key in template.specializations] == [repr([('mode', 'a')]), repr([('mode', 'c')])]
+    assert template.get_specialized_function('sync_context', mode='a') is first
+    assert template.get_specialized_function('sync_context', mode='b')() == 'b'
+    assert template.specialization_stats == {'hits': 3, 'misses': 4, 'evictions': 2}
+
+
+def test_specialized_functions_are_not_cached_with_zero_size():
+    @transfunction(max_specializations=0)
+    def template(mode):
+        return mode
+
+    assert template.get_specialized_function('sync_context', mode='a')() == 'a'
+    assert template.get_specialized_function('sync_context', mode='a')() == 'a'
+    assert template.specialization_stats == {'hits': 0, 'misses': 2, 'evictions': 0}
+    assert len(template.specializations) == 0
+
+
+def test_wrong_max_specializations():
+    with pytest.raises(ValueError, match=match('The maximum number of specialized functions must be a non-negative integer, not -1.')):
+        @transfunction(max_specializations=-1)
+        def template():
+            pass
+
+
+def test_wrong_specializations():
+    @transfunction
+    def template(a, *args, b=1, **kwargs):
+        a += 1
+        return a, b, args, kwargs
+
+    with pytest.raises(ValueError, match=match('Unknown context "kek_context". Use one of: sync_context, async_context, generator_context, async_generator_context.')):
+        template.get_specialized_function('kek_context', b=1)
+
+    for name in ('kek', 'args', 'kwargs'):
+        with pytest.raises(ValueError, match=match(f'The template has no argument "{name}" that can be fixed.')):
+            template.get_specialized_function('sync_context', **{name: 1})
+
+    with pytest.raises(ValueError, match=match('The value of the argument "b" can\'t be embedded into the code: []. Use None, booleans, numbers, strings, bytes or tuples of them.')):
+        template.get_specialized_function('sync_context', b=[])
+
+    with pytest.raises(ValueError, match=match('The argument "a" is assigned or redefined in the template, so it can\'t be fixed.')):
+        template.get_specialized_function('sync_context', a=1)
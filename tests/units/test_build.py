@@ -0,0 +1,187 @@
+import sys
+from asyncio import run
+from importlib import import_module
+from textwrap import dedent
+from uuid import uuid4
+
+import pytest
+from full_match import match
+
+from transfunctions import prebuilt
+from transfunctions.__main__ import main
+from transfunctions.build import build_package
+from transfunctions.prebuilt import PREBUILT_MODULE_NAME, prebuilt_functions
+from transfunctions.transformer import FunctionTransformer
+
+MODULE_SOURCE = '''
+from transfunctions import async_context, await_it, generator_context, superfunction, sync_context, transfunction
+
+NUMBER = 10
+
+async def multiply(number):
+    return number * 100
+
+@transfunction
+def template(a, b=NUMBER, *, c: int = 3) -> int:
+    with sync_context:
+        return a + b + c
+    with async_context:
+        return await_it(multiply(a))
+    with generator_context:
+        yield a
+
+class SomeClass:
+    @transfunction
+    def method(self, number):
+        return number * 2
+
+@superfunction
+def some_superfunction(number):
+    with sync_context:
+        return number
+    with generator_context:
+        yield number
+
+def factory():
+    closure_variable = 1
+
+    @transfunction
+    def local_template():
+        return closure_variable
+
+    return local_template
+'''
+
+
+requires_unparse = pytest.mark.skipif(sys.version_info < (3, 9), reason='Building of prebuilt functions requires Python 3.9 or newer.')
+
+
+@pytest.fixture
+def package_name(tmp_path, monkeypatch):
+    name = f'package_{uuid4().hex}'
+    package_path = tmp_path / name
+    package_path.mkdir()
+    (package_path / '__init__.py').write_text('')
+    (package_path / 'module.py').write_text(dedent(MODULE_SOURCE))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    return name
+
+
+@pytest.fixture
+def no_compilation(monkeypatch):
+    def compile_context(*args, **kwargs):  # noqa: ARG001
+        raise AssertionError
+
+    monkeypatch.setattr(FunctionTransformer, 'compile_context', compile_context)
+
+
+@requires_unparse
+def test_build_creates_prebuilt_module(package_name):
+    path = build_package(package_name)
+
+    assert path.name == f'{PREBUILT_MODULE_NAME}.py'
+    source = path.read_text()
+    compile(source, filename=str(path), mode='exec')
+    assert 'local_template' not in source
+    assert f'# async_context of {package_name}.module.template, line 9.' in source
+
+
+@requires_unparse
+def test_command_line_interface(package_name, capsys):
+    assert main(['build', package_name]) == 0
+
+    assert 'The prebuilt functions are saved to' in capsys.readouterr().out
+
+
+@requires_unparse
+def test_build_not_a_package(package_name):
+    with pytest.raises(ValueError, match=match(f'"{package_name}.module" is not a package.')):
+        build_package(f'{package_name}.module')
+
+
+@requires_unparse
+def test_prebuilt_functions_are_used_without_compilation(package_name, no_compilation):  # noqa: ARG001
+    build_package(package_name)
+    module = import_module(f'{package_name}.module')
+
+    assert module.template.get_usual_function()(1) == 14
+    assert module.template.get_usual_function()(1, 2, c=5) == 8
+    assert run(module.template.get_async_function()(1)) == 100
+    assert list(module.template.get_generator_function()(1)) == [1]
+    assert module.SomeClass().method.get_usual_function()(3) == 6
+    assert ~module.some_superfunction(5) == 5
+    assert list(module.some_superfunction(6)) == [6]
+
+
+@requires_unparse
+def test_prebuilt_functions_are_used_without_parsing(package_name, no_compilation, monkeypatch):  # noqa: ARG001
+    build_package(package_name)
+    # The build loads the source code of the templates, so the module is imported again, as in a new process.
+    del sys.modules[f'{package_name}.module']
+    module = import_module(f'{package_name}.module')
+
+    def load_source_code(*args, **kwargs):  # noqa: ARG001
+        raise AssertionError
+
+    monkeypatch.setattr(FunctionTransformer, 'load_source_code', load_source_code)
+
+    assert module.template.get_usual_function()(1) == 14
+    assert list(module.some_superfunction(6)) == [6]
+
+
+@requires_unparse
+def test_prebuilt_function_keeps_metadata(package_name):
+    build_package(package_name)
+    module = import_module(f'{package_name}.module')
+
+    function = module.template.get_usual_function()
+
+    assert function.__name__ == 'template'
+    assert function.__module__ == module.__name__
+    assert function.__annotations__ == {'c': int, 'return': int}
+    assert function.__wrapped__ is module.template.function
+
+
+@requires_unparse
+def test_templates_with_closures_are_compiled_as_usual(package_name):
+    build_package(package_name)
+    module = import_module(f'{package_name}.module')
+
+    assert module.factory().get_usual_function()() == 1
+
+
+@requires_unparse
+def test_changed_template_is_not_taken_from_prebuilt_module(package_name):
+    build_package(package_name)
+    module = import_module(f'{package_name}.module')
+    module.template.get_usual_function()
+
+    key = (module.__name__, 'template', module.template.function.__code__.co_firstlineno, 'async_context')
+    prebuilt_functions[key] = ('another hash', prebuilt_functions[key][1])
+
+    assert run(module.template.get_async_function()(1)) == 100
+
+
+@requires_unparse
+def test_prebuilt_module_of_other_library_version_is_not_used(package_name, monkeypatch):
+    build_package(package_name)
+    module = import_module(f'{package_name}.module')
+    monkeypatch.setattr(prebuilt, 'LIBRARY_VERSION', 'kek')
+
+    compiled_contexts = []
+    original_compile_context = FunctionTransformer.compile_context
+
+    def counting_compile_context(self, context_name, addictional_transformers):
+        compiled_contexts.append(context_name)
+        return original_compile_context(self, context_name, addictional_transformers)
+
+    monkeypatch.setattr(FunctionTransformer, 'compile_context', counting_compile_context)
+
+    assert module.template.get_usual_function()(1) == 14
+    assert compiled_contexts == ['sync_context']
+
+
+@pytest.mark.skipif(sys.version_info >= (3, 9), reason='The build works on this version of Python.')
+def test_build_on_old_python(package_name):
+    with pytest.raises(RuntimeError, match=match('Building of prebuilt functions requires Python 3.9 or newer.')):
+        build_package(package_name)
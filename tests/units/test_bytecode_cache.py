@@ -0,0 +1,127 @@
+import sys
+from asyncio import run
+from types import SimpleNamespace
+
+import pytest
+
+from transfunctions import (
+    async_context,
+    disable_bytecode_cache,
+    enable_bytecode_cache,
+    sync_context,
+    transfunction,
+)
+from transfunctions import transformer as transformer_module
+from transfunctions.bytecode_cache import BytecodeCache, get_bytecode_cache
+from transfunctions.transformer import FunctionTransformer
+
+
+@pytest.fixture
+def cache_directory(tmp_path):
+    enable_bytecode_cache(tmp_path)
+    yield tmp_path
+    disable_bytecode_cache()
+
+
+def make_template():
+    @transfunction
+    def template(a, b=2):
+        with sync_context:
+            return a + b
+        with async_context:
+            return a * b
+
+    return template
+
+
+def test_cache_is_disabled_by_default():
+    assert get_bytecode_cache() is None
+
+
+def test_enable_and_disable_cache(tmp_path):
+    enable_bytecode_cache(tmp_path)
+
+    assert isinstance(get_bytecode_cache(), BytecodeCache)
+    assert get_bytecode_cache().directory == tmp_path
+
+    disable_bytecode_cache()
+
+    assert get_bytecode_cache() is None
+
+
+def test_save_and_load_code(tmp_path):
+    cache = BytecodeCache(tmp_path)
+    code = compile('a = 1', filename='<string>', mode='exec')
+    key = BytecodeCache.make_key('something')
+
+    assert cache.load(key) is None
+
+    cache.save(key, code)
+
+    assert cache.load(key) == code
+    assert [path.name for path in tmp_path.rglob('*')] == [key[:2], f'{key}.tfc']
+
+
+def test_keys_are_different_for_different_parts():
+    assert BytecodeCache.make_key('a', 'bc') != BytecodeCache.make_key('ab', 'c')
+    assert BytecodeCache.make_key('a', 'b') == BytecodeCache.make_key('a', 'b')
+
+
+@pytest.mark.parametrize(
+    'content',
+    [
+        b'',
+        b'garbage',
+    ],
+)
+def test_broken_cache_file_is_ignored(tmp_path, content):
+    cache = BytecodeCache(tmp_path)
+    key = BytecodeCache.make_key('something')
+    cache.get_path(key).parent.mkdir(parents=True)
+    cache.get_path(key).write_bytes(content)
+
+    assert cache.load(key) is None
+
+
+def test_generated_functions_are_cached_on_disk(cache_directory):
+    template = make_template()
+
+    assert template.get_usual_function()(1) == 3
+    assert run(template.get_async_function()(3)) == 6
+
+    assert len(list(cache_directory.rglob('*.tfc'))) == 2
+    assert not list(cache_directory.rglob('*.tmp'))
+
+
+def test_cached_code_is_used_instead_of_compilation(cache_directory, monkeypatch):  # noqa: ARG001
+    make_template().get_usual_function()
+
+    def compile_context(*args, **kwargs):  # noqa: ARG001
+        raise AssertionError
+
+    monkeypatch.setattr(FunctionTransformer, 'compile_context', compile_context)
+
+    function = make_template().get_usual_function()
+
+    assert function(1) == 3
+    assert function(1, b=5) == 6
+
+
+def test_cached_code_of_other_optimization_level_is_not_used(cache_directory, monkeypatch):
+    compiled_contexts = []
+    original_compile_context = FunctionTransformer.compile_context
+
+    def counting_compile_context(self, context_name, addictional_transformers):
+        compiled_contexts.append(context_name)
+        return original_compile_context(self, context_name, addictional_transformers)
+
+    monkeypatch.setattr(FunctionTransformer, 'compile_context', counting_compile_context)
+    flags = {name: getattr(sys.flags, name) for name in dir(sys.flags) if not name.startswith('_') and not callable(getattr(sys.flags, name))}
+
+    for optimization_level in (0, 1, 0):
+        monkeypatch.setattr(sys, 'flags', SimpleNamespace(**{**flags, 'optimize': optimization_level}))
+        monkeypatch.setattr(transformer_module, 'shared_code_cache', {})
+        make_template().get_usual_function()
+
+    assert compiled_contexts == ['sync_context', 'sync_context']
+    assert len(list(cache_directory.rglob('*.tfc'))) == 2
@@ -0,0 +1,138 @@
+from asyncio import run
+from collections import OrderedDict
+from sys import _getframe
+
+from transfunctions import call_sites
+from transfunctions.call_sites import (
+    ASYNC_ITERATION_MODE,
+    AWAIT_MODE,
+    DISCARD_MODE,
+    ITERATION_MODE,
+    detect_call_site_mode,
+    get_call_site_mode,
+)
+
+
+class Probe:
+    def __init__(self):
+        self.modes = []
+
+    def __call__(self, *args, **kwargs):  # noqa: ARG002
+        frame = _getframe(1)
+        self.modes.append(detect_call_site_mode(frame.f_code, frame.f_lasti, 'probe'))
+        return self
+
+    def __iter__(self):
+        return iter(())
+
+    def __await__(self):
+        return iter(())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+    def __invert__(self):
+        return self
+
+
+def test_detect_modes():
+    probe = Probe()
+
+    async def coroutine_function():
+        await probe()
+        async for _ in probe():
+            pass
+
+    def generator_function():
+        yield from probe()
+
+    probe()
+    for _ in probe():
+        pass
+    list(generator_function())
+    run(coroutine_function())
+    result = probe()
+    ~probe()
+    probe(*[1], a=2)
+    [probe(), 1]
+
+    assert result is probe
+    assert probe.modes == [DISCARD_MODE, ITERATION_MODE, ITERATION_MODE, AWAIT_MODE, ASYNC_ITERATION_MODE, None, None, DISCARD_MODE, None]
+
+
+def test_not_a_call():
+    def function():
+        return 1
+
+    assert detect_call_site_mode(function.__code__, 0, 'function') is None
+    assert detect_call_site_mode(function.__code__, -1, 'function') is None
+    assert detect_call_site_mode(function.__code__, 100000, 'function') is None
+
+
+def test_modes_are_cached(monkeypatch):
+    detections = []
+    original_detect_call_site_mode = call_sites.detect_call_site_mode
+
+    def counting_detect_call_site_mode(code, offset, function_name):
+        detections.append((code, offset))
+        return original_detect_call_site_mode(code, offset, function_name)
+
+    monkeypatch.setattr(call_sites, 'detect_call_site_mode', counting_detect_call_site_mode)
+    monkeypatch.setattr(call_sites, 'call_site_modes', OrderedDict())
+
+    def get_mode():
+        return get_call_site_mode(_getframe(1), 'get_mode')
+
+    modes = []
+    for _ in range(3):
+        modes.append(get_mode())
+        get_mode()
+
+    assert modes == [None, None, None]
+    assert len(detections) == 2
+    assert len(call_sites.call_site_modes) == 2
+
+
+def test_calls_from_c_code_are_not_detected():
+    probe = Probe()
+
+    for _ in list(map(probe, [1, 2])):
+        pass
+    for _ in filter(probe, [1, 2]):
+        pass
+
+    assert probe.modes == [None, None, None, None]
+
+
+def test_other_callees_are_not_detected():
+    probe = Probe()
+    other_probe = probe
+    condition = True
+
+    for _ in other_probe():
+        pass
+    for _ in (list if condition else probe)(map(probe, [1])):
+        pass
+    for _ in probe(1 if condition else 2):
+        pass
+
+    assert probe.modes == [None, None, None]
+
+
+def test_number_of_call_sites_is_limited(monkeypatch):
+    monkeypatch.setattr(call_sites, 'call_site_modes', OrderedDict())
+    monkeypatch.setattr(call_sites, 'MAX_CALL_SITES', 2)
+
+    def get_mode():
+        return get_call_site_mode(_getframe(1), 'get_mode')
+
+    get_mode()
+    first_keys = list(call_sites.call_site_modes)
+    get_mode()
+    get_mode()
+
+    assert len(call_sites.call_site_modes) == 2
+    assert first_keys[0] not in call_sites.call_site_modes
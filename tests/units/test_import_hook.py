@@ -0,0 +1,229 @@
+import sys
+from asyncio import run
+from importlib import import_module
+from textwrap import dedent
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from transfunctions import bytecode_cache, install_import_hook, uninstall_import_hook
+from transfunctions.import_hook import TransfunctionsLoader, finder
+from transfunctions.prebuilt import register_prebuilt_function
+from transfunctions.transformer import FunctionTransformer
+
+MODULE_SOURCE = '''
+from transfunctions import async_context, await_it, generator_context, superfunction, sync_context, transfunction
+
+NUMBER = 10
+
+async def multiply(number):
+    return number * 100
+
+@transfunction
+def template(a, b=NUMBER, *, c: int = 3) -> int:
+    with sync_context:
+        return a + b + c
+    with async_context:
+        return await_it(multiply(a))
+    with generator_context:
+        yield a
+
+@transfunction
+def template_without_async_variant():
+    yield 1
+    return 2
+
+class SomeClass:
+    @transfunction
+    def method(self, number):
+        return number * 2
+
+    class NestedClass:
+        @superfunction
+        def nested_method(self, number):
+            with sync_context:
+                return number + 1
+            with generator_context:
+                yield number
+
+CONFIG = {'DEBUG': True}
+
+@transfunction(constants=CONFIG)
+def template_with_constants():
+    if DEBUG:
+        return 'debug'
+    return 'release'
+
+OPTIONS = {'constants': {'DEBUG': True}}
+
+@transfunction(**OPTIONS)
+def template_with_unpacked_constants():
+    if DEBUG:
+        return 'debug'
+    return 'release'
+
+def factory():
+    closure_variable = 1
+
+    @transfunction
+    def local_template():
+        return closure_variable
+
+    return local_template
+'''
+
+
+@pytest.fixture
+def package_name(tmp_path, monkeypatch):
+    name = f'package_{uuid4().hex}'
+    package_path = tmp_path / name
+    package_path.mkdir()
+    (package_path / '__init__.py').write_text('')
+    (package_path / 'module.py').write_text(dedent(MODULE_SOURCE))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    install_import_hook(name)
+    yield name
+    uninstall_import_hook()
+
+
+@pytest.fixture
+def no_compilation(monkeypatch):
+    def compile_context(*args, **kwargs):  # noqa: ARG001
+        raise AssertionError
+
+    monkeypatch.setattr(FunctionTransformer, 'compile_context', compile_context)
+
+
+def test_install_and_uninstall_hook():
+    install_import_hook('some_package')
+
+    assert finder in sys.meta_path
+    assert finder.is_expanded('some_package')
+    assert finder.is_expanded('some_package.some_module')
+    assert not finder.is_expanded('some_package_2')
+
+    uninstall_import_hook()
+
+    assert finder not in sys.meta_path
+    assert not finder.is_expanded('some_package')
+
+
+def test_module_is_loaded_by_hook(package_name):
+    module = import_module(f'{package_name}.module')
+
+    assert isinstance(module.__loader__, TransfunctionsLoader)
+
+
+def test_other_modules_are_not_affected(package_name):  # noqa: ARG001
+    assert not isinstance(import_module('json').__loader__, TransfunctionsLoader)
+
+
+def test_functions_are_generated_without_compilation(package_name, no_compilation):  # noqa: ARG001
+    module = import_module(f'{package_name}.module')
+
+    assert module.template.get_usual_function()(1) == 14
+    assert module.template.get_usual_function()(1, 2, c=5) == 8
+    assert run(module.template.get_async_function()(1)) == 100
+    assert list(module.template.get_generator_function()(1)) == [1]
+    assert module.SomeClass().method.get_usual_function()(3) == 6
+    assert ~module.SomeClass.NestedClass().nested_method(5) == 6
+    assert list(module.SomeClass.NestedClass().nested_method(6)) == [6]
+
+
+def test_functions_keep_metadata(package_name):
+    module = import_module(f'{package_name}.module')
+
+    function = module.template.get_usual_function()
+
+    assert function.__name__ == 'template'
+    assert function.__module__ == module.__name__
+    assert function.__annotations__ == {'c': int, 'return': int}
+    assert function.__wrapped__ is module.template.function
+
+
+def test_template_names_are_not_replaced_by_variants(package_name):
+    module = import_module(f'{package_name}.module')
+
+    assert isinstance(module.template, FunctionTransformer)
+    assert isinstance(module.SomeClass.__dict__['method'], FunctionTransformer)
+
+
+def test_wrong_variants_are_left_to_runtime(package_name):
+    module = import_module(f'{package_name}.module')
+
+    with pytest.raises(SyntaxError):
+        module.template_without_async_variant.get_async_function()
+
+
+def test_templates_with_closures_are_compiled_as_usual(package_name):
+    module = import_module(f'{package_name}.module')
+
+    assert module.factory().get_usual_function()() == 1
+
+
+def test_templates_with_constants_are_compiled_as_usual(package_name):
+    module = import_module(f'{package_name}.module')
+
+    assert module.template_with_constants.get_usual_function()() == 'debug'
+    assert module.template_with_unpacked_constants.get_usual_function()() == 'debug'
+
+
+def test_prebuilt_code_without_hash_is_not_used_with_constants(package_name):
+    module = import_module(f'{package_name}.module')
+    template = module.template_with_constants
+
+    register_prebuilt_function(module.__name__, 'template_with_constants', template.function.__code__.co_firstlineno, 'sync_context', None, module.template_without_async_variant.function)
+
+    assert template.get_usual_function()() == 'debug'
+
+
+def test_expanded_code_is_cached(package_name, tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+
+    import_module(f'{package_name}.module')
+
+    assert list((tmp_path / package_name / '__pycache__').glob('module.*.opt-transfunctions.pyc'))
+
+    del sys.modules[f'{package_name}.module']
+    module = import_module(f'{package_name}.module')
+
+    assert module.template.get_usual_function()(1) == 14
+
+
+def count_expansions(monkeypatch):
+    paths = []
+    original_source_to_code = TransfunctionsLoader.source_to_code
+
+    def counting_source_to_code(self, data, path='<string>', *, _optimize=-1):
+        paths.append(path)
+        return original_source_to_code(self, data, path, _optimize=_optimize)
+
+    monkeypatch.setattr(TransfunctionsLoader, 'source_to_code', counting_source_to_code)
+    return paths
+
+
+def test_cached_code_of_other_library_version_is_not_used(package_name, monkeypatch):
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+    import_module(f'{package_name}.module')
+    expansions = count_expansions(monkeypatch)
+
+    monkeypatch.setattr(bytecode_cache, 'LIBRARY_VERSION', 'kek')
+    for _ in range(2):
+        del sys.modules[f'{package_name}.module']
+        import_module(f'{package_name}.module')
+
+    assert len(expansions) == 1
+
+
+def test_optimization_level_is_taken_into_account(package_name, tmp_path, monkeypatch):
+    flags = {name: getattr(sys.flags, name) for name in dir(sys.flags) if not name.startswith('_') and not callable(getattr(sys.flags, name))}
+    monkeypatch.setattr(sys, 'flags', SimpleNamespace(**{**flags, 'optimize': 2}))
+    monkeypatch.setattr(sys, 'dont_write_bytecode', False)
+
+    import_module(f'{package_name}.module')
+
+    assert [path.name.split('.')[-2] for path in (tmp_path / package_name / '__pycache__').glob('module.*.pyc')] == ['opt-transfunctions2']
+
+    code = TransfunctionsLoader('module', 'module.py').source_to_code('# transfunction\nassert False\n', 'module.py', _optimize=2)
+    exec(code, {})
@@ -0,0 +1,169 @@
+import pytest
+
+from transfunctions import (
+    async_context,
+    disable_bytecode_cache,
+    disable_stats,
+    enable_bytecode_cache,
+    enable_stats,
+    reset_stats,
+    stats,
+    sync_context,
+    transfunction,
+)
+from transfunctions import transformer as transformer_module
+from transfunctions.instrumentation import (
+    StatsCollector,
+    get_stats_collector,
+    measure_stage,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_stats(monkeypatch):
+    monkeypatch.setattr(transformer_module, 'shared_code_cache', {})
+    disable_stats()
+    yield
+    disable_stats()
+
+
+def make_template():
+    @transfunction
+    def template(number):
+        with sync_context:
+            return number
+        with async_context:
+            return number + 1
+
+    return template
+
+
+def test_stats_are_disabled_by_default():
+    make_template().get_usual_function()
+
+    assert get_stats_collector() is None
+    assert stats() == {'stages': {}, 'caches': {}, 'functions': {}}
+
+
+def test_stages_of_generation():
+    enable_stats()
+
+    make_template().get_async_function()
+
+    stages = stats()['stages']
+
+    assert {'source.index', 'copy', 'transform.DeleteDecorator', 'transform.RewriteContexts', 'transform.ConvertSyncFunctionToAsync', 'transform.ExtractAwaitExpressions', 'compile', 'instantiate'} <= set(stages)
+    for stage in stages.values():
+        assert stage['count'] >= 1
+        assert stage['total'] >= stage['max'] >= 0
+
+
+def test_stats_of_functions_and_caches():
+    enable_stats()
+
+    def factory():
+        return make_template()
+
+    first_template = factory()
+    first_template.get_usual_function()
+    first_template.get_usual_function()
+    first_template.get_async_function()
+    factory().get_usual_function()
+
+    snapshot = stats()
+    function_name = f'{__name__}.make_template.<locals>.template'
+    functions = snapshot['functions'][function_name]
+
+    assert set(functions) == {'sync_context', 'async_context'}
+    assert functions['sync_context']['count'] == 2
+    assert functions['sync_context']['hits'] == 1
+    assert functions['sync_context']['misses'] == 2
+    assert functions['sync_context']['code_size'] > 0
+    assert functions['sync_context']['total'] >= functions['sync_context']['max'] > 0
+    assert functions['async_context']['count'] == 1
+
+    assert snapshot['caches']['transformer'] == {'hits': 1, 'misses': 3}
+    assert snapshot['caches']['shared'] == {'hits': 1, 'misses': 2}
+    assert snapshot['caches']['prebuilt'] == {'hits': 0, 'misses': 2}
+    assert 'bytecode' not in snapshot['caches']
+
+
+def test_bytecode_cache_stats(tmp_path):
+    enable_stats()
+    enable_bytecode_cache(tmp_path)
+
+    try:
+        make_template().get_usual_function()
+    finally:
+        disable_bytecode_cache()
+
+    assert stats()['caches']['bytecode'] == {'hits': 0, 'misses': 1}
+
+
+def test_slow_generation_callback():
+    slow_generations = []
+    enable_stats(slow_generation_threshold=0, on_slow_generation=lambda *args: slow_generations.append(args))
+
+    template = make_template()
+    template.get_usual_function()
+    template.get_usual_function()
+
+    assert len(slow_generations) == 1
+    function_name, context_name, duration = slow_generations[0]
+    assert function_name == template.get_full_name()
+    assert context_name == 'sync_context'
+    assert duration > 0
+
+
+def test_fast_generation_does_not_call_callback():
+    slow_generations = []
+    enable_stats(slow_generation_threshold=100, on_slow_generation=lambda *args: slow_generations.append(args))
+
+    make_template().get_usual_function()
+
+    assert slow_generations == []
+
+
+def test_reset_stats_keeps_settings():
+    def callback(*args):
+        pass
+
+    enable_stats(slow_generation_threshold=1, on_slow_generation=callback)
+    make_template().get_usual_function()
+
+    reset_stats()
+
+    assert stats() == {'stages': {}, 'caches': {}, 'functions': {}}
+    assert get_stats_collector().slow_generation_threshold == 1
+    assert get_stats_collector().on_slow_generation is callback
+
+
+def test_reset_disabled_stats():
+    reset_stats()
+
+    assert get_stats_collector() is None
+
+
+def test_snapshot_is_a_copy():
+    enable_stats()
+    make_template().get_usual_function()
+
+    snapshot = stats()
+    snapshot['stages'].clear()
+
+    assert stats()['stages']
+
+
+def test_measure_stage():
+    collector = StatsCollector()
+
+    with measure_stage('kek'):
+        pass
+
+    enable_stats()
+
+    with pytest.raises(ValueError, match='kek'), measure_stage('kek'):
+        raise ValueError('kek')
+
+    assert stats()['stages']['kek']['count'] == 1
+    assert collector.get_snapshot() == {'stages': {}, 'caches': {}, 'functions': {}}
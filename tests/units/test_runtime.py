@@ -0,0 +1,97 @@
+from asyncio import run, sleep
+from itertools import count, islice
+from threading import get_ident
+from time import sleep as blocking_sleep
+
+import pytest
+from full_match import match
+
+from transfunctions.runtime import (
+    gather_in_threads,
+    map_concurrently,
+    map_in_threads,
+    map_lazily,
+)
+
+
+def test_gather_in_threads():
+    assert gather_in_threads() == []
+    assert gather_in_threads(lambda: 1, lambda: 2) == [1, 2]
+
+
+def test_map_in_threads_without_limit_is_a_loop():
+    assert map_in_threads(lambda item: (item, get_ident()), [1, 2]) == [(1, get_ident()), (2, get_ident())]
+
+
+def test_map_in_threads_keeps_order():
+    def function(item):
+        blocking_sleep(0.01 * (5 - item))
+        return item * 2
+
+    assert map_in_threads(function, range(5), limit=3) == [0, 2, 4, 6, 8]
+
+
+def test_map_lazily_takes_items_by_request():
+    taken = []
+
+    def numbers():
+        for number in count():
+            taken.append(number)
+            yield number
+
+    iterator = map_lazily(lambda item: item * 2, numbers(), limit=2)
+
+    assert list(islice(iterator, 3)) == [0, 2, 4]
+    assert len(taken) <= 5
+    iterator.close()
+
+    assert list(map_lazily(lambda item: item + 1, [1, 2, 3])) == [2, 3, 4]
+    assert list(map_lazily(lambda item: item + 1, [], limit=2)) == []
+
+
+def test_map_concurrently_keeps_order_and_limit():
+    active = []
+    maximum = []
+
+    async def function(item):
+        active.append(item)
+        maximum.append(len(active))
+        await sleep(0.001 * (10 - item))
+        active.remove(item)
+        return item * 2
+
+    assert run(map_concurrently(function, range(10), limit=3)) == [item * 2 for item in range(10)]
+    assert max(maximum) == 3
+
+    assert run(map_concurrently(function, range(10))) == [item * 2 for item in range(10)]
+    assert max(maximum) == 10
+
+    assert run(map_concurrently(function, [], limit=3)) == []
+
+
+def test_map_concurrently_cancels_other_workers_after_exception():
+    finished = []
+
+    async def function(item):
+        if item == 0:
+            raise ValueError('kek')
+        await sleep(0.01)
+        finished.append(item)
+        return item
+
+    async def main():
+        with pytest.raises(ValueError, match=match('kek')):
+            await map_concurrently(function, range(10), limit=3)
+        await sleep(0.05)
+
+    run(main())
+
+    assert finished == []
+
+
+@pytest.mark.parametrize('limit', [0, -1, 1.5, True])
+def test_wrong_limit(limit):
+    with pytest.raises(ValueError, match=match(f'The limit must be a positive integer, not {limit!r}.')):
+        map_in_threads(lambda item: item, [1], limit=limit)
+    with pytest.raises(ValueError, match=match(f'The limit must be a positive integer, not {limit!r}.')):
+        list(map_lazily(lambda item: item, [1], limit=limit))
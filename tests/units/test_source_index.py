@@ -0,0 +1,94 @@
+import linecache
+from inspect import getsource
+
+from transfunctions import source_index as source_index_module
+from transfunctions import sync_context, transfunction
+from transfunctions.source_index import SourceIndex, get_function_span, get_source_index
+
+
+def decorator(function):
+    return function
+
+
+@decorator
+def decorated_function():
+    return 1
+
+
+def not_decorated_function():
+    return 2
+
+
+class SomeClass:
+    @decorator
+    @decorator
+    def method(self):
+        return 3
+
+
+def test_span_of_decorated_function():
+    span = get_function_span(decorated_function)
+
+    assert span.source == getsource(decorated_function)
+    assert span.first_line_number == decorated_function.__code__.co_firstlineno
+    assert span.last_line_number == span.first_line_number + 2
+    assert span.node.name == 'decorated_function'
+    assert span.node.lineno == span.first_line_number + 1
+
+
+def test_span_of_method_with_several_decorators():
+    span = get_function_span(SomeClass.method)
+
+    assert span.source == getsource(SomeClass.method)
+    assert span.node.name == 'method'
+
+
+def test_not_decorated_functions_are_not_indexed():
+    assert get_function_span(not_decorated_function) is None
+
+
+def test_function_without_source_file():
+    namespace = {}
+    exec('identity = lambda x: x\n@identity\ndef function():\n    pass', namespace)
+
+    assert get_function_span(namespace['function']) is None
+
+
+def test_index_is_built_once_for_file(monkeypatch):
+    created_indexes = []
+    original_init = SourceIndex.__init__
+
+    def counting_init(self, lines):
+        created_indexes.append(self)
+        original_init(self, lines)
+
+    monkeypatch.setattr(SourceIndex, '__init__', counting_init)
+    monkeypatch.setattr(source_index_module, 'indexes', {})
+
+    for function in (decorated_function, SomeClass.method, decorated_function):
+        assert get_function_span(function) is not None
+
+    assert len(created_indexes) == 1
+
+
+def test_index_is_rebuilt_if_lines_are_changed(monkeypatch):
+    index = get_source_index(decorated_function)
+    filename = decorated_function.__code__.co_filename
+    new_lines = list(linecache.getlines(filename))
+
+    monkeypatch.setattr(linecache, 'getlines', lambda *args: new_lines)  # noqa: ARG005
+
+    new_index = get_source_index(decorated_function)
+
+    assert new_index is not index
+    assert new_index.lines is new_lines
+
+
+def test_transfunctions_use_index():
+    @transfunction
+    def template():
+        with sync_context:
+            return 1
+
+    assert template.get_usual_function()() == 1
+    assert template.template_tree.body[0] is get_function_span(template.function).node
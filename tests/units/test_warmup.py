@@ -0,0 +1,188 @@
+from asyncio import run
+from threading import Event
+
+import pytest
+
+from transfunctions import (
+    WarmupHandle,
+    async_context,
+    generator_context,
+    superfunction,
+    sync_context,
+    transfunction,
+    warmup,
+)
+from transfunctions.transformer import FunctionTransformer
+
+
+def make_template():
+    @transfunction
+    def template(number):
+        with sync_context:
+            return number
+        with async_context:
+            return number + 1
+        with generator_context:
+            yield number + 2
+
+    return template
+
+
+def test_warmup_compiles_all_contexts():
+    template = make_template()
+
+    handle = warmup(template)
+
+    assert isinstance(handle, WarmupHandle)
+    assert handle.done()
+    assert handle.wait(0)
+    assert handle.total == 4
+    assert handle.completed == 4
+    assert handle.progress == 1.0
+    assert handle.errors == []
+    assert handle.duration >= 0
+    assert set(template.cache) == {'sync_context', 'async_context', 'generator_context', 'async_generator_context'}
+    assert [result.context_name for result in handle.results] == ['sync_context', 'async_context', 'generator_context', 'async_generator_context']
+    assert all(result.qualname == template.function.__qualname__ and result.duration >= 0 for result in handle.results)
+
+
+def test_warmup_selected_contexts():
+    template = make_template()
+
+    handle = warmup([template], contexts=['async_context'])
+
+    assert handle.total == 1
+    assert set(template.cache) == {'async_context'}
+    assert run(template.get_async_function()(1)) == 2
+
+
+def test_warmup_uses_declared_contexts():
+    @transfunction(contexts=('generator_context',))
+    def template():
+        with generator_context:
+            yield 1
+
+    handle = warmup(template)
+
+    assert [result.context_name for result in handle.results] == ['generator_context']
+
+
+def test_warmup_several_targets():
+    templates = [make_template(), make_template()]
+
+    handle = warmup(templates, contexts=['sync_context'])
+
+    assert handle.total == 2
+    assert all('sync_context' in template.cache for template in templates)
+
+
+def test_warmup_superfunction():
+    @superfunction(tilde_syntax=False)
+    def function():
+        with sync_context:
+            pass
+
+    handle = warmup(function)
+
+    assert handle.total == 4
+    assert set(function.__transformer__.cache) == {'sync_context', 'async_context', 'generator_context', 'async_generator_context'}
+
+
+def test_errors_are_collected():
+    @transfunction
+    def template():
+        yield 1
+        return 2
+
+    handle = warmup(template, contexts=['sync_context', 'async_context'])
+
+    assert handle.done()
+    assert handle.completed == 2
+    assert len(handle.errors) == 1
+    assert handle.errors[0].context_name == 'async_context'
+    assert isinstance(handle.errors[0].error, SyntaxError)
+
+
+def test_background_warmup(monkeypatch):
+    template = make_template()
+    release = Event()
+    original_extract_context = FunctionTransformer.extract_context
+
+    def waiting_extract_context(self, *args, **kwargs):
+        release.wait()
+        return original_extract_context(self, *args, **kwargs)
+
+    monkeypatch.setattr(FunctionTransformer, 'extract_context', waiting_extract_context)
+
+    handle = warmup(template, background=True)
+
+    assert not handle.done()
+    assert not handle.wait(0.01)
+    assert handle.completed == 0
+    assert handle.progress == 0.0
+    assert 'finished' not in repr(handle)
+
+    release.set()
+
+    assert handle.wait(5)
+    assert handle.progress == 1.0
+    assert repr(handle) == '<WarmupHandle 4/4 finished>'
+    assert set(template.cache) == {'sync_context', 'async_context', 'generator_context', 'async_generator_context'}
+
+
+def test_empty_warmup():
+    handle = warmup([])
+
+    assert handle.done()
+    assert handle.progress == 1.0
+    assert handle.total == 0
+
+
+def test_wrong_target():
+    with pytest.raises(TypeError, match='Only transfunctions and superfunctions can be warmed up'):
+        warmup([lambda: None])
+
+
+def test_unknown_context():
+    with pytest.raises(ValueError, match='Unknown context "kek_context". Use one of: sync_context, async_context, generator_context, async_generator_context.'):
+        warmup(make_template(), contexts=['kek_context'])
+
+
+def test_precompile_argument():
+    @transfunction(precompile=True)
+    def template():
+        with sync_context:
+            return 1
+        with generator_context:
+            yield 2
+
+    assert template.precompilation.done()
+    assert len(template.precompilation.errors) == 0
+    assert set(template.cache) == {'sync_context', 'async_context', 'generator_context', 'async_generator_context'}
+
+
+def test_precompile_argument_in_background():
+    @transfunction(contexts=('sync_context',), precompile='background')
+    def template():
+        with sync_context:
+            return 1
+
+    assert template.precompilation.wait(5)
+    assert template.precompilation.total == 1
+    assert template.get_usual_function()() == 1
+
+
+def test_precompile_argument_of_superfunction():
+    @superfunction(precompile=True)
+    def function():
+        return 1
+
+    assert function.__transformer__.precompilation.done()
+    assert ~function() == 1
+
+
+def test_without_precompilation():
+    template = make_template()
+
+    assert template.precompilation is None
+    assert template.cache == {}
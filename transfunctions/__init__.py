@@ -1,3 +1,9 @@
+from transfunctions.bytecode_cache import (
+    disable_bytecode_cache as disable_bytecode_cache,  # noqa: PLC0414
+)
+from transfunctions.bytecode_cache import (
+    enable_bytecode_cache as enable_bytecode_cache,  # noqa: PLC0414
+)
 from transfunctions.decorators.superfunction import (
     superfunction as superfunction,  # noqa: PLC0414
 )
@@ -19,18 +25,57 @@ from transfunctions.errors import (
 from transfunctions.errors import (
     WrongTransfunctionSyntaxError as WrongTransfunctionSyntaxError,  # noqa: PLC0414
 )
+from transfunctions.import_hook import (
+    install_import_hook as install_import_hook,  # noqa: PLC0414
+)
+from transfunctions.import_hook import (
+    uninstall_import_hook as uninstall_import_hook,  # noqa: PLC0414
+)
+from transfunctions.instrumentation import (
+    disable_stats as disable_stats,  # noqa: PLC0414
+)
+from transfunctions.instrumentation import (
+    enable_stats as enable_stats,  # noqa: PLC0414
+)
+from transfunctions.instrumentation import (
+    reset_stats as reset_stats,  # noqa: PLC0414
+)
+from transfunctions.instrumentation import (
+    stats as stats,  # noqa: PLC0414
+)
 from transfunctions.markers import (
     async_context as async_context,  # noqa: PLC0414
 )
+from transfunctions.markers import (
+    async_generator_context as async_generator_context,  # noqa: PLC0414
+)
 from transfunctions.markers import (
     await_it as await_it,  # noqa: PLC0414
 )
+from transfunctions.markers import (
+    gather_it as gather_it,  # noqa: PLC0414
+)
 from transfunctions.markers import (
     generator_context as generator_context,  # noqa: PLC0414
 )
+from transfunctions.markers import (
+    is_async as is_async,  # noqa: PLC0414
+)
+from transfunctions.markers import (
+    is_generator as is_generator,  # noqa: PLC0414
+)
+from transfunctions.markers import (
+    map_it as map_it,  # noqa: PLC0414
+)
 from transfunctions.markers import (
     sync_context as sync_context,  # noqa: PLC0414
 )
 from transfunctions.markers import (
     yield_from_it as yield_from_it,  # noqa: PLC0414
 )
+from transfunctions.warmup import (
+    WarmupHandle as WarmupHandle,  # noqa: PLC0414
+)
+from transfunctions.warmup import (
+    warmup as warmup,  # noqa: PLC0414
+)
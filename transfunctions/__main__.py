@@ -0,0 +1,24 @@
+import sys
+from argparse import ArgumentParser
+from typing import List, Optional
+
+from transfunctions.build import build_package
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = ArgumentParser(prog='python -m transfunctions', description='Tools for the transfunctions library.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Generate the functions of all templates in a package ahead of time.')
+    build_parser.add_argument('package', help='The name of an importable package.')
+
+    parsed_arguments = parser.parse_args(arguments)
+
+    path = build_package(parsed_arguments.package)
+    sys.stdout.write(f'The prebuilt functions are saved to {path}.\n')
+
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
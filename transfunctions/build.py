@@ -0,0 +1,97 @@
+import ast
+import sys
+from importlib import import_module
+from inspect import isclass
+from pathlib import Path
+from pkgutil import walk_packages
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Set, cast
+
+from transfunctions.prebuilt import PREBUILT_MODULE_NAME
+from transfunctions.transformer import FunctionTransformer
+
+PREBUILT_MODULE_HEADER = '''# This file was generated by "python -m transfunctions build", don't edit it manually.
+from transfunctions.prebuilt import register_prebuilt_function
+'''
+
+
+def find_templates(module: ModuleType) -> List[FunctionTransformer[Any, Any]]:
+    templates: List[FunctionTransformer[Any, Any]] = []
+    visited_ids: Set[int] = set()
+
+    def visit_namespace(namespace: Dict[str, Any]) -> None:
+        for value in list(namespace.values()):
+            if id(value) in visited_ids:
+                continue
+            visited_ids.add(id(value))
+
+            if isclass(value) and value.__module__ == module.__name__:
+                visit_namespace(dict(vars(value)))
+                continue
+
+            if getattr(value, '__is_superfunction__', False):
+                value = value.__transformer__  # noqa: PLW2901
+
+            if (
+                isinstance(value, FunctionTransformer)
+                and value.function.__module__ == module.__name__
+                and not value.function.__code__.co_freevars
+                and '<locals>' not in value.function.__qualname__
+            ):
+                templates.append(value)
+
+    visit_namespace(vars(module))
+
+    return templates
+
+
+def generate_function_source(transformer: FunctionTransformer[Any, Any], context_name: str) -> Optional[str]:
+    try:
+        tree = transformer.transform_tree(context_name, None)
+        function_def = cast(ast.FunctionDef, tree.body[0])
+
+        # Default values and annotations are taken from the template at runtime, so they are not evaluated a second time.
+        transformer.remove_defaults_and_annotations(function_def)
+
+        compile(tree, filename=f'<{PREBUILT_MODULE_NAME}>', mode='exec')
+    except SyntaxError:
+        return None
+
+    return ast.unparse(function_def)
+
+
+def generate_module_source(modules: List[ModuleType]) -> str:
+    chunks = [PREBUILT_MODULE_HEADER]
+
+    for module in modules:
+        for template in find_templates(module):
+            template_hash = template.get_template_hash()
+
+            for context_name in FunctionTransformer.context_names:
+                function_source = generate_function_source(template, context_name)
+                if function_source is not None:
+                    # The generated source loses the line numbers of the template, so tracebacks point to this module, and the comment shows where the function comes from.
+                    chunks.append(f'\n\n# {context_name} of {module.__name__}.{template.function.__qualname__}, line {template.function.__code__.co_firstlineno}.\n{function_source}\n\n')
+                    chunks.append(f'register_prebuilt_function({module.__name__!r}, {template.function.__qualname__!r}, {template.function.__code__.co_firstlineno}, {context_name!r}, {template_hash!r}, {template.function.__name__})\n')
+
+    return ''.join(chunks)
+
+
+def build_package(package_name: str) -> Path:
+    # The source code of the generated functions is produced by ast.unparse(), which appeared in Python 3.9.
+    if sys.version_info < (3, 9):  # pragma: no cover
+        raise RuntimeError('Building of prebuilt functions requires Python 3.9 or newer.')
+
+    package = import_module(package_name)
+    if not hasattr(package, '__path__'):
+        raise ValueError(f'"{package_name}" is not a package.')
+
+    modules = [package]
+    for module_info in walk_packages(package.__path__, prefix=f'{package_name}.'):
+        if module_info.name.rsplit('.', maxsplit=1)[-1] != PREBUILT_MODULE_NAME:
+            modules.append(import_module(module_info.name))
+
+    path = Path(package.__path__[0]) / f'{PREBUILT_MODULE_NAME}.py'
+    path.write_text(generate_module_source(modules), encoding='utf-8')
+
+    return path
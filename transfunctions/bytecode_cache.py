@@ -0,0 +1,98 @@
+import marshal
+import os
+import sys
+from hashlib import sha256
+from importlib.metadata import PackageNotFoundError, version
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+from tempfile import mkstemp
+from types import CodeType
+from typing import Optional, Union
+
+CACHE_FILE_SUFFIX = '.tfc'
+
+try:
+    LIBRARY_VERSION = version('transfunctions')
+except PackageNotFoundError:  # pragma: no cover
+    LIBRARY_VERSION = 'unknown'
+
+
+class BytecodeCache:
+    def __init__(self, directory: Union[str, 'os.PathLike[str]']) -> None:
+        self.directory = Path(directory)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        digest = sha256()
+        # The optimization level is a part of the key, because the code compiled with -O has no asserts.
+        for part in (sys.implementation.cache_tag or sys.implementation.name, LIBRARY_VERSION, str(sys.flags.optimize), *parts):
+            encoded_part = part.encode('utf-8')
+            digest.update(len(encoded_part).to_bytes(8, 'little'))
+            digest.update(encoded_part)
+        return digest.hexdigest()
+
+    def get_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f'{key}{CACHE_FILE_SUFFIX}'
+
+    def load(self, key: str) -> Optional[CodeType]:
+        try:
+            with open(self.get_path(key), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        header = MAGIC_NUMBER + key.encode('ascii')
+        if not data.startswith(header):
+            return None
+
+        try:
+            code = marshal.loads(data[len(header):])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+        if not isinstance(code, CodeType):
+            return None
+
+        return code
+
+    def save(self, key: str, code: CodeType) -> None:
+        path = self.get_path(key)
+        data = MAGIC_NUMBER + key.encode('ascii') + marshal.dumps(code)
+
+        # The file is written under a temporary name and then atomically renamed, so that concurrent processes never see a partially written file.
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary_path = mkstemp(dir=path.parent, prefix=f'.{key}', suffix='.tmp')
+        except OSError:
+            return
+
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            Path(temporary_path).replace(path)
+        except OSError:
+            try:
+                Path(temporary_path).unlink()
+            except OSError:
+                pass
+
+
+bytecode_cache: Optional[BytecodeCache] = None
+
+
+def enable_bytecode_cache(directory: Union[str, 'os.PathLike[str]']) -> None:
+    global bytecode_cache  # noqa: PLW0603
+    bytecode_cache = BytecodeCache(directory)
+
+
+def disable_bytecode_cache() -> None:
+    global bytecode_cache  # noqa: PLW0603
+    bytecode_cache = None
+
+
+def get_bytecode_cache() -> Optional[BytecodeCache]:
+    return bytecode_cache
+
+
+if os.environ.get('TRANSFUNCTIONS_CACHE_DIR'):
+    enable_bytecode_cache(os.environ['TRANSFUNCTIONS_CACHE_DIR'])
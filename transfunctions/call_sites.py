@@ -0,0 +1,134 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from dis import (
+    HAVE_ARGUMENT,
+    Instruction,
+    get_instructions,
+    hasjabs,
+    hasjrel,
+    stack_effect,
+)
+from sys import version_info
+from types import CodeType, FrameType
+from typing import List, Optional, Tuple
+
+AWAIT_MODE = 'await'
+ITERATION_MODE = 'iteration'
+ASYNC_ITERATION_MODE = 'async_iteration'
+DISCARD_MODE = 'discard'
+
+CALL_OPERATION_NAMES = frozenset((
+    'CALL',
+    'CALL_KW',
+    'CALL_FUNCTION',
+    'CALL_FUNCTION_KW',
+    'CALL_FUNCTION_EX',
+    'CALL_METHOD',
+))
+MODES_BY_NEXT_OPERATION_NAME = {
+    'GET_AWAITABLE': AWAIT_MODE,
+    'GET_AITER': ASYNC_ITERATION_MODE,
+    'GET_ITER': ITERATION_MODE,
+    'GET_YIELD_FROM_ITER': ITERATION_MODE,
+    'POP_TOP': DISCARD_MODE,
+}
+NAME_LOADING_OPERATION_NAMES = frozenset((
+    'LOAD_NAME',
+    'LOAD_GLOBAL',
+    'LOAD_FAST',
+    'LOAD_FAST_CHECK',
+    'LOAD_FAST_BORROW',
+    'LOAD_DEREF',
+    'LOAD_CLASSDEREF',
+    'LOAD_FROM_DICT_OR_DEREF',
+    'LOAD_FROM_DICT_OR_GLOBALS',
+    'LOAD_ATTR',
+    'LOAD_METHOD',
+    'LOAD_SUPER_ATTR',
+))
+JUMP_OPERATION_CODES = frozenset(hasjrel + hasjabs)
+UNCONDITIONAL_JUMP_OPERATION_NAMES = frozenset((
+    'JUMP',
+    'JUMP_FORWARD',
+    'JUMP_ABSOLUTE',
+    'JUMP_NO_INTERRUPT',
+))
+
+MAX_CALL_SITES = 4096
+
+call_site_modes: 'OrderedDict[Tuple[CodeType, int, str], Optional[str]]' = OrderedDict()
+
+
+def detect_call_site_mode(code: CodeType, offset: int, function_name: str) -> Optional[str]:
+    instructions = list(get_instructions(code))
+    # The offset can point to the inline cache after the call instruction, so the nearest instruction before it is taken.
+    index = bisect_right([instruction.offset for instruction in instructions], offset) - 1
+
+    if index < 0 or index + 1 >= len(instructions) or instructions[index].opname not in CALL_OPERATION_NAMES:
+        return None
+
+    # The frame of the caller points to the same instruction when the function is called from C code, for example by map() inside list(map(...)).
+    # So the mode is trusted only if the called object is loaded right here by the name of the function.
+    if detect_callee_name(instructions, index) != function_name:
+        return None
+
+    return MODES_BY_NEXT_OPERATION_NAME.get(instructions[index + 1].opname)
+
+
+def detect_callee_name(instructions: List[Instruction], index: int) -> Optional[str]:
+    call = instructions[index]
+    # The depth is the number of stack items, consumed by the call, that are not pushed yet by the instructions after the current one.
+    depth = 1 - get_stack_effect(call)
+    # In Python 3.11 a call is made by 2 instructions.
+    if index and instructions[index - 1].opname == 'PRECALL':
+        index -= 1
+        depth -= get_stack_effect(instructions[index])
+    # Since Python 3.11 the called object always takes 2 items on the stack, and before that only a method call does.
+    callee_size = 2 if version_info >= (3, 11) or call.opname == 'CALL_METHOD' else 1
+
+    while index > 0:
+        index -= 1
+        instruction = instructions[index]
+
+        if depth <= callee_size and instruction.opname in NAME_LOADING_OPERATION_NAMES and isinstance(instruction.argval, str):
+            if index and instructions[index - 1].opname == 'PUSH_NULL':
+                index -= 1
+            # The callee can be a branch of a conditional expression, like "(list if condition else function)(...)".
+            if index and is_forward_jump(instructions[index - 1]):
+                return None
+            return instruction.argval
+
+        # Anything else is followed only through the arguments, and only if there are no branches inside them.
+        if (depth <= callee_size and instruction.opname != 'PUSH_NULL') or instruction.is_jump_target or instruction.opcode in JUMP_OPERATION_CODES:
+            return None
+
+        new_depth = depth - get_stack_effect(instruction)
+        if depth > callee_size > new_depth or new_depth <= 0:
+            return None
+        depth = new_depth
+
+    return None
+
+
+def is_forward_jump(instruction: Instruction) -> bool:
+    return instruction.opname in UNCONDITIONAL_JUMP_OPERATION_NAMES and instruction.argval > instruction.offset
+
+
+def get_stack_effect(instruction: Instruction) -> int:
+    return stack_effect(instruction.opcode, instruction.arg if instruction.opcode >= HAVE_ARGUMENT else None)
+
+
+def get_call_site_mode(frame: FrameType, function_name: str) -> Optional[str]:
+    key = (frame.f_code, frame.f_lasti, function_name)
+
+    try:
+        return call_site_modes[key]
+    except KeyError:
+        mode = call_site_modes[key] = detect_call_site_mode(*key)
+        # The code objects of the callers are kept in the keys, so only a limited number of the newest call sites is remembered.
+        while len(call_site_modes) > MAX_CALL_SITES:
+            try:
+                call_site_modes.popitem(last=False)
+            except KeyError:  # pragma: no cover
+                break
+        return mode
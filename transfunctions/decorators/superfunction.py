@@ -1,71 +1,101 @@
-import weakref
-from ast import AST, NodeTransformer, Return
+from ast import Call, Name, NodeVisitor, Return, With
 from functools import wraps
 from inspect import currentframe
+from sys import _getframe
 from types import FrameType, TracebackType
-from typing import Any, Dict, Generic, List, Optional, Type, Union, cast, overload
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+    cast,
+    overload,
+)
 
 from displayhooks import not_display
 
+from transfunctions.call_sites import (
+    ASYNC_ITERATION_MODE,
+    AWAIT_MODE,
+    DISCARD_MODE,
+    ITERATION_MODE,
+    get_call_site_mode,
+)
 from transfunctions.errors import WrongTransfunctionSyntaxError
 from transfunctions.transformer import FunctionTransformer
 from transfunctions.typing import (
+    AsyncGenerator,
     Callable,
     Coroutine,
     FunctionParams,
     Generator,
     ReturnType,
 )
+from transfunctions.warmup import warmup
 
 
-class ParamSpecContainer(Generic[FunctionParams]):
-    def __init__(self, *args: FunctionParams.args, **kwargs: FunctionParams.kwargs) -> None:
-        self.args = args
-        self.kwargs = kwargs
-
 class UsageTracer(Generic[FunctionParams, ReturnType], Coroutine[Any, None, ReturnType], Generator[ReturnType, None, None]):
+    # It's created on each call of a superfunction, so it stores only the necessary minimum and creates nothing in advance.
+    __slots__ = ('args', 'coroutine', 'kwargs', 'tilde_syntax', 'transformer', 'used')
+
     def __init__(
         self,
-        param_spec: ParamSpecContainer[FunctionParams],
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
         transformer: FunctionTransformer[FunctionParams, ReturnType],
         tilde_syntax: bool,
     ) -> None:
-        self.flags: Dict[str, bool] = {}
-        self.args = param_spec.args
-        self.kwargs = param_spec.kwargs
+        self.used = False
+        self.args = args
+        self.kwargs = kwargs
         self.transformer = transformer
         self.tilde_syntax = tilde_syntax
-        self.coroutine = self.async_option(self.flags, param_spec, transformer)
-        self.finalizer = weakref.finalize(
-            self,
-            self.sync_option,
-            self.flags,
-            param_spec,
-            transformer,
-            self.coroutine,
-            tilde_syntax,
-        )
+        self.coroutine: Optional[Coroutine[Any, Any, ReturnType]] = None
+
+    def __del__(self) -> None:
+        # A superfunction that was called, but neither awaited, nor iterated, nor inverted, is used as a usual function.
+        if self.used:
+            return
+        self.used = True
+
+        if not self.tilde_syntax:
+            self.transformer.get_usual_function()(*(self.args), **(self.kwargs))
+            return
+        raise NotImplementedError(f'The tilde-syntax is enabled for the "{self.transformer.function.__name__}" function. Call it like this: ~{self.transformer.function.__name__}().')
 
     def __iter__(self) -> Generator[ReturnType, None, None]:
-        self.flags['used'] = True
-        self.coroutine.close()
-        generator_function = self.transformer.get_generator_function()
-        generator = generator_function(*(self.args), **(self.kwargs))
-        yield from generator
+        # The generator is returned as is, so there is no extra frame on each step, and send(), throw() and close() go straight to it.
+        self.used = True
+        return self.transformer.get_generator_function()(*(self.args), **(self.kwargs))
+
+    def __aiter__(self) -> AsyncGenerator[ReturnType, None]:
+        # The values are produced one by one, when the loop asks for them, so nothing is collected in advance.
+        self.used = True
+        return self.transformer.get_async_generator_function()(*(self.args), **(self.kwargs))
 
     def __await__(self) -> Generator[Any, None, ReturnType]:
-        return self.coroutine.__await__()  # pragma: no cover
+        return self.get_coroutine().__await__()
 
     def __invert__(self) -> ReturnType:
         if not self.tilde_syntax:
             raise NotImplementedError('The syntax with ~ is disabled for this superfunction. Call it with simple breackets.')
 
-        self.flags['used'] = True
-        self.coroutine.close()
+        self.used = True
         return self.transformer.get_usual_function()(*(self.args), **(self.kwargs))
 
+    def get_coroutine(self) -> Coroutine[Any, Any, ReturnType]:
+        if self.coroutine is None:
+            self.used = True
+            self.coroutine = self.transformer.get_async_function()(*(self.args), **(self.kwargs))
+        return self.coroutine
+
     def send(self, value: Any) -> Any:
-        return self.coroutine.send(value)
+        return self.get_coroutine().send(value)
 
     def throw(self, exception_type: Type[BaseException], value: Optional[BaseException] = None, traceback: Optional[TracebackType] = None) -> None:  # type: ignore[override] # pragma: no cover
         pass
@@ -73,29 +103,23 @@ class UsageTracer(Generic[FunctionParams, ReturnType], Coroutine[Any, None, Retu
     def close(self) -> None:  # pragma: no cover
         pass
 
-    @staticmethod
-    def sync_option(
-        flags: Dict[str, bool],
-        param_spec: ParamSpecContainer[FunctionParams],
-        transformer: FunctionTransformer[FunctionParams, ReturnType],
-        wrapped_coroutine: Coroutine[Any, Any, ReturnType],
-        tilde_syntax: bool,
-    ) -> Optional[ReturnType]:
-        if not flags.get('used', False):
-            wrapped_coroutine.close()
-            if not tilde_syntax:
-                return transformer.get_usual_function()(*param_spec.args, **param_spec.kwargs)
-            raise NotImplementedError(f'The tilde-syntax is enabled for the "{transformer.function.__name__}" function. Call it like this: ~{transformer.function.__name__}().')
-        return None
 
-    @staticmethod
-    async def async_option(
-        flags: Dict[str, bool], param_spec: ParamSpecContainer[FunctionParams], transformer: FunctionTransformer[FunctionParams, ReturnType]) -> ReturnType:
-        flags['used'] = True
-        return await transformer.get_async_function()(*param_spec.args, **param_spec.kwargs)
+not_display(UsageTracer)
 
 
-not_display(UsageTracer)
+class NoReturns(NodeVisitor):
+    def visit_With(self, node: With) -> None:  # noqa: N802
+        if len(node.items) == 1:
+            context_expr = node.items[0].context_expr
+            if isinstance(context_expr, Call):
+                context_expr = context_expr.func
+            # Returns are allowed in the blocks that are not included into the usual function.
+            if isinstance(context_expr, Name) and context_expr.id in FunctionTransformer.context_names and context_expr.id != 'sync_context':
+                return
+        self.generic_visit(node)
+
+    def visit_Return(self, node: Return) -> None:  # noqa: ARG002, N802
+        raise WrongTransfunctionSyntaxError('A superfunction cannot contain a return statement.')
 
 
 @overload
@@ -104,12 +128,12 @@ def superfunction(function: Callable[FunctionParams, ReturnType]) -> Callable[Fu
 
 @overload
 def superfunction(
-    *, tilde_syntax: bool = True, check_decorators: bool = True,
+    *, tilde_syntax: bool = True, check_decorators: bool = True, contexts: Optional[Sequence[str]] = None, constants: Optional[Dict[str, Any]] = None, max_specializations: int = 128, precompile: Union[bool, Literal['background']] = False,
 ) -> Callable[[Callable[FunctionParams, ReturnType]], Callable[FunctionParams, UsageTracer[FunctionParams, ReturnType]]]: ...
 
 
-def superfunction(  # type: ignore[misc]
-    *args: Callable[FunctionParams, ReturnType], tilde_syntax: bool = True, check_decorators: bool = True,
+def superfunction(  # type: ignore[misc]  # noqa: PLR0913
+    *args: Callable[FunctionParams, ReturnType], tilde_syntax: bool = True, check_decorators: bool = True, contexts: Optional[Sequence[str]] = None, constants: Optional[Dict[str, Any]] = None, max_specializations: int = 128, precompile: Union[bool, Literal['background']] = False,
 ) -> Union[
     Callable[FunctionParams, UsageTracer[FunctionParams, ReturnType]],
     Callable[[Callable[FunctionParams, ReturnType]], Callable[FunctionParams, UsageTracer[FunctionParams, ReturnType]]],
@@ -119,21 +143,42 @@ def superfunction(  # type: ignore[misc]
             function,
             cast(FrameType, cast(FrameType, currentframe()).f_back).f_lineno,
             "superfunction",
-            cast(FrameType, cast(FrameType, currentframe()).f_back),
             check_decorators,
+            contexts=contexts,
+            constants=constants,
+            max_specializations=max_specializations,
         )
+        # The transformer is available in the module only as an attribute of the wrapper.
+        transformer.qualname = f'{function.__qualname__}.__transformer__'
 
         if not tilde_syntax:
-            class NoReturns(NodeTransformer):
-                def visit_Return(self, node: Return) -> Optional[Union[AST, List[AST]]]:  # noqa: ARG002, N802
-                    raise WrongTransfunctionSyntaxError('A superfunction cannot contain a return statement.')
-            transformer.get_usual_function(addictional_transformers=[NoReturns()])
+            # Only the tree of the template is checked here, the function itself is generated on the first call.
+            NoReturns().visit(transformer.get_template_tree(copy=False))
+
+        if precompile:
+            transformer.precompilation = warmup(transformer, background=(precompile == 'background'))
+
+        function_name = function.__name__
 
         @wraps(function)
         def wrapper(*args: FunctionParams.args, **kwargs: FunctionParams.kwargs) -> UsageTracer[FunctionParams, ReturnType]:
-            return UsageTracer(ParamSpecContainer(*args, **kwargs), transformer, tilde_syntax)
+            # If it's clear from the bytecode of the caller how the result is used, the right function is called at once, without the tracer.
+            mode = get_call_site_mode(_getframe(1), function_name)
+
+            if mode == AWAIT_MODE:
+                return transformer.get_async_function()(*args, **kwargs)  # type: ignore[return-value]
+            if mode == ITERATION_MODE:
+                return transformer.get_generator_function()(*args, **kwargs)  # type: ignore[return-value]
+            if mode == ASYNC_ITERATION_MODE:
+                return transformer.get_async_generator_function()(*args, **kwargs)  # type: ignore[return-value]
+            if mode == DISCARD_MODE and not tilde_syntax:
+                transformer.get_usual_function()(*args, **kwargs)
+                return None  # type: ignore[return-value]
+
+            return UsageTracer(args, kwargs, transformer, tilde_syntax)
 
         wrapper.__is_superfunction__ = True  # type: ignore[attr-defined]
+        wrapper.__transformer__ = transformer  # type: ignore[attr-defined]
 
         return wrapper
 
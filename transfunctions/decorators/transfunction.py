@@ -1,9 +1,10 @@
 from inspect import currentframe
 from types import FrameType
-from typing import Union, cast, overload
+from typing import Any, Dict, Literal, Optional, Sequence, Union, cast, overload
 
 from transfunctions.transformer import FunctionTransformer
 from transfunctions.typing import Callable, FunctionParams, ReturnType
+from transfunctions.warmup import warmup
 
 
 @overload
@@ -12,26 +13,34 @@ def transfunction(function: Callable[FunctionParams, ReturnType]) -> FunctionTra
 
 @overload
 def transfunction(
-    *, check_decorators: bool = True,
+    *, check_decorators: bool = True, contexts: Optional[Sequence[str]] = None, constants: Optional[Dict[str, Any]] = None, max_specializations: int = 128, precompile: Union[bool, Literal['background']] = False,
 ) -> Callable[[Callable[FunctionParams, ReturnType]], FunctionTransformer[FunctionParams, ReturnType]]: ...
 
 
 def transfunction(  # type: ignore[misc]
-    *args: Callable[FunctionParams, ReturnType], check_decorators: bool = True,
+    *args: Callable[FunctionParams, ReturnType], check_decorators: bool = True, contexts: Optional[Sequence[str]] = None, constants: Optional[Dict[str, Any]] = None, max_specializations: int = 128, precompile: Union[bool, Literal['background']] = False,
 ) -> Union[Callable[[Callable[FunctionParams, ReturnType]], FunctionTransformer[FunctionParams, ReturnType]], FunctionTransformer[FunctionParams, ReturnType]]:
-    frame = currentframe()
+    # Only the line number is taken from the frame, so that the frame is not kept by the closure below.
+    decorator_lineno = cast(FrameType, cast(FrameType, currentframe()).f_back).f_lineno
 
     def decorator(
         function: Callable[FunctionParams, ReturnType],
     ) -> FunctionTransformer[FunctionParams, ReturnType]:
-        return FunctionTransformer(
+        transformer = FunctionTransformer(
             function,
-            cast(FrameType, cast(FrameType, frame).f_back).f_lineno,
+            decorator_lineno,
             "transfunction",
-            cast(FrameType, cast(FrameType, frame).f_back),
             check_decorators,
+            contexts=contexts,
+            constants=constants,
+            max_specializations=max_specializations,
         )
 
+        if precompile:
+            transformer.precompilation = warmup(transformer, background=(precompile == 'background'))
+
+        return transformer
+
     if args:
         return decorator(args[0])
 
@@ -0,0 +1,195 @@
+import marshal
+import sys
+from ast import (
+    Attribute,
+    Call,
+    ClassDef,
+    Constant,
+    Expr,
+    FunctionDef,
+    Load,
+    Module,
+    Name,
+    copy_location,
+    fix_missing_locations,
+    parse,
+    stmt,
+)
+from copy import deepcopy
+from importlib.abc import MetaPathFinder
+from importlib.machinery import ModuleSpec, PathFinder, SourceFileLoader
+from importlib.util import MAGIC_NUMBER, cache_from_source, decode_source
+from types import CodeType, ModuleType
+from typing import List, Optional, Sequence, Set, Union
+
+from transfunctions.bytecode_cache import BytecodeCache
+from transfunctions.transformer import FunctionTransformer
+
+TEMPLATE_DECORATOR_NAMES = ('transfunction', 'superfunction')
+BYTECODE_OPTIMIZATION_TAG = 'transfunctions'
+
+
+class TemplateExpander:
+    def __init__(self, module_name: str, filename: str) -> None:
+        self.module_name = module_name
+        self.filename = filename
+
+    def expand(self, tree: Module) -> Module:
+        tree.body = self.expand_body(tree.body, [])
+        return fix_missing_locations(tree)
+
+    def expand_body(self, body: List[stmt], qualname_prefix: List[str]) -> List[stmt]:
+        new_body: List[stmt] = []
+
+        for node in body:
+            if isinstance(node, ClassDef):
+                node.body = self.expand_body(node.body, [*qualname_prefix, node.name])
+            elif isinstance(node, FunctionDef) and self.is_template(node):
+                new_body.extend(self.create_variants(node, '.'.join([*qualname_prefix, node.name])))
+            new_body.append(node)
+
+        return new_body
+
+    @staticmethod
+    def is_template(node: FunctionDef) -> bool:
+        if len(node.decorator_list) != 1:
+            return False
+
+        decorator = node.decorator_list[0]
+        if isinstance(decorator, Call):
+            # The values of constants are known only at runtime, so such templates are generated as usual. Constants can also be hidden in "**" arguments.
+            if any(keyword.arg in ('constants', None) for keyword in decorator.keywords):
+                return False
+            decorator = decorator.func
+
+        return isinstance(decorator, Name) and decorator.id in TEMPLATE_DECORATOR_NAMES
+
+    def create_variants(self, node: FunctionDef, qualname: str) -> List[stmt]:
+        variants: List[stmt] = []
+
+        for context_name in FunctionTransformer.context_names:
+            variant = deepcopy(node)
+            variant.decorator_list = []
+            variant_tree = Module(body=[variant], type_ignores=[])
+
+            try:
+                FunctionTransformer.apply_context(variant_tree, node.name, context_name, None)
+                function_def = variant_tree.body[0]
+                FunctionTransformer.remove_defaults_and_annotations(function_def)  # type: ignore[arg-type]
+                fix_missing_locations(variant_tree)
+                # Variants that can't be compiled (for example, with "await" in a usual function) are left to the runtime, where they raise a proper exception.
+                compile(variant_tree, filename=self.filename, mode='exec')
+            except SyntaxError:
+                continue
+
+            variants.append(function_def)
+            variants.append(copy_location(self.create_registration(node, qualname, context_name), node))
+
+        return variants
+
+    def create_registration(self, node: FunctionDef, qualname: str, context_name: str) -> Expr:
+        register_function = Attribute(
+            value=Attribute(
+                value=Call(func=Name(id='__import__', ctx=Load()), args=[Constant(value='transfunctions.prebuilt')], keywords=[]),
+                attr='prebuilt',
+                ctx=Load(),
+            ),
+            attr='register_prebuilt_function',
+            ctx=Load(),
+        )
+
+        return Expr(
+            value=Call(
+                func=register_function,
+                args=[
+                    Constant(value=self.module_name),
+                    Constant(value=qualname),
+                    Constant(value=node.decorator_list[0].lineno),
+                    Constant(value=context_name),
+                    Constant(value=None),
+                    Name(id=node.name, ctx=Load()),
+                ],
+                keywords=[],
+            ),
+        )
+
+
+class TransfunctionsLoader(SourceFileLoader):
+    def source_to_code(self, data: Union[bytes, str], path: str = '<string>', *, _optimize: int = -1) -> CodeType:  # type: ignore[override]
+        source = decode_source(data) if isinstance(data, bytes) else data
+
+        if not any(decorator_name in source for decorator_name in TEMPLATE_DECORATOR_NAMES):
+            return compile(data, path, 'exec', dont_inherit=True, optimize=_optimize)
+
+        tree = TemplateExpander(self.name, path).expand(parse(source, filename=path))
+        return compile(tree, path, 'exec', dont_inherit=True, optimize=_optimize)
+
+    def get_code(self, fullname: str) -> CodeType:
+        source_path = self.get_filename(fullname)
+        optimization_level = sys.flags.optimize
+        # The expanded code is cached separately from the usual bytecode, so the ordinary loader and this one never take each other's files. Like the usual bytecode, each optimization level has its own file.
+        bytecode_path = cache_from_source(source_path, optimization=f'{BYTECODE_OPTIMIZATION_TAG}{optimization_level or ""}')
+        source_stats = self.path_stats(source_path)
+        header = b''.join([
+            MAGIC_NUMBER,
+            (0).to_bytes(4, 'little'),
+            (int(source_stats['mtime']) & 0xFFFFFFFF).to_bytes(4, 'little'),
+            (int(source_stats.get('size', 0)) & 0xFFFFFFFF).to_bytes(4, 'little'),
+            # The expanded code depends on the version of the library, so it's a part of the key, as well as the optimization level.
+            BytecodeCache.make_key(BYTECODE_OPTIMIZATION_TAG).encode('ascii'),
+        ])
+
+        try:
+            data = self.get_data(bytecode_path)
+        except OSError:
+            pass
+        else:
+            if data.startswith(header):
+                try:
+                    return marshal.loads(data[len(header):])  # type: ignore[no-any-return]
+                except (EOFError, ValueError, TypeError):
+                    pass
+
+        code = self.source_to_code(self.get_data(source_path), source_path, _optimize=optimization_level)
+
+        if not sys.dont_write_bytecode:
+            try:
+                self.set_data(bytecode_path, header + marshal.dumps(code))
+            except NotImplementedError:  # pragma: no cover
+                pass
+
+        return code
+
+
+class TransfunctionsFinder(MetaPathFinder):
+    def __init__(self) -> None:
+        self.package_names: Set[str] = set()
+
+    def is_expanded(self, fullname: str) -> bool:
+        return any(fullname == package_name or fullname.startswith(f'{package_name}.') for package_name in self.package_names)
+
+    def find_spec(self, fullname: str, path: Optional[Sequence[str]], target: Optional[ModuleType] = None) -> Optional[ModuleSpec]:
+        if not self.is_expanded(fullname):
+            return None
+
+        spec = PathFinder.find_spec(fullname, path, target)
+        if spec is None or not isinstance(spec.loader, SourceFileLoader) or spec.origin is None:
+            return spec
+
+        spec.loader = TransfunctionsLoader(fullname, spec.origin)
+        return spec
+
+
+finder = TransfunctionsFinder()
+
+
+def install_import_hook(*package_names: str) -> None:
+    finder.package_names.update(package_names)
+    if finder not in sys.meta_path:
+        sys.meta_path.insert(0, finder)
+
+
+def uninstall_import_hook() -> None:
+    finder.package_names.clear()
+    if finder in sys.meta_path:
+        sys.meta_path.remove(finder)
@@ -0,0 +1,104 @@
+import marshal
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from types import CodeType
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+SlowGenerationCallback = Callable[[str, str, float], Any]
+
+
+class StatsCollector:
+    def __init__(self, slow_generation_threshold: Optional[float] = None, on_slow_generation: Optional[SlowGenerationCallback] = None) -> None:
+        self.slow_generation_threshold = slow_generation_threshold
+        self.on_slow_generation = on_slow_generation
+        self.lock = Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.caches: Dict[str, Dict[str, int]] = {}
+        self.functions: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    @staticmethod
+    def add_duration_to(container: Dict[str, float], duration: float) -> None:
+        container['count'] = container.get('count', 0) + 1
+        container['total'] = container.get('total', 0.0) + duration
+        container['max'] = max(container.get('max', 0.0), duration)
+
+    def add_stage(self, stage_name: str, duration: float) -> None:
+        with self.lock:
+            self.add_duration_to(self.stages.setdefault(stage_name, {}), duration)
+
+    def add_cache_result(self, cache_name: str, hit: bool, function_name: Optional[str] = None, context_name: Optional[str] = None) -> None:
+        key = 'hits' if hit else 'misses'
+
+        with self.lock:
+            cache = self.caches.setdefault(cache_name, {'hits': 0, 'misses': 0})
+            cache[key] += 1
+            if function_name is not None and context_name is not None:
+                function = self.functions.setdefault((function_name, context_name), {})
+                function[key] = function.get(key, 0) + 1
+
+    def add_generation(self, function_name: str, context_name: str, duration: float, code: CodeType) -> None:
+        # The size of the marshalled code is not the size in memory, but it's proportional to it and cheap to get.
+        code_size = len(marshal.dumps(code))
+
+        with self.lock:
+            function = self.functions.setdefault((function_name, context_name), {})
+            self.add_duration_to(function, duration)
+            function['code_size'] = code_size
+
+        if self.on_slow_generation is not None and self.slow_generation_threshold is not None and duration >= self.slow_generation_threshold:
+            self.on_slow_generation(function_name, context_name, duration)
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            functions: Dict[str, Dict[str, Dict[str, float]]] = {}
+            for (function_name, context_name), function in self.functions.items():
+                functions.setdefault(function_name, {})[context_name] = dict(function)
+
+            return {
+                'stages': {stage_name: dict(stage) for stage_name, stage in self.stages.items()},
+                'caches': {cache_name: dict(cache) for cache_name, cache in self.caches.items()},
+                'functions': functions,
+            }
+
+
+stats_collector: Optional[StatsCollector] = None
+
+
+def enable_stats(slow_generation_threshold: Optional[float] = None, on_slow_generation: Optional[SlowGenerationCallback] = None) -> None:
+    global stats_collector  # noqa: PLW0603
+    stats_collector = StatsCollector(slow_generation_threshold, on_slow_generation)
+
+
+def disable_stats() -> None:
+    global stats_collector  # noqa: PLW0603
+    stats_collector = None
+
+
+def reset_stats() -> None:
+    if stats_collector is not None:
+        enable_stats(stats_collector.slow_generation_threshold, stats_collector.on_slow_generation)
+
+
+def get_stats_collector() -> Optional[StatsCollector]:
+    return stats_collector
+
+
+def stats() -> Dict[str, Any]:
+    if stats_collector is None:
+        return {'stages': {}, 'caches': {}, 'functions': {}}
+    return stats_collector.get_snapshot()
+
+
+@contextmanager
+def measure_stage(stage_name: str) -> Iterator[None]:
+    collector = stats_collector
+    if collector is None:
+        yield
+        return
+
+    start_time = perf_counter()
+    try:
+        yield
+    finally:
+        collector.add_stage(stage_name, perf_counter() - start_time)
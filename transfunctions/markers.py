@@ -1,7 +1,7 @@
 from contextlib import contextmanager
-from typing import Any, Generator, NoReturn
+from typing import Any, Generator, Iterable, List, NoReturn, Optional
 
-from transfunctions.typing import IterableWithResults
+from transfunctions.typing import Callable, IterableWithResults
 
 
 @contextmanager
@@ -16,15 +16,32 @@ def create_sync_context() -> Generator[NoReturn, None, None]:
 def create_generator_context() -> Generator[NoReturn, None, None]:
     yield  # type: ignore[misc]  # pragma: no cover
 
+@contextmanager
+def create_async_generator_context() -> Generator[NoReturn, None, None]:
+    yield  # type: ignore[misc]  # pragma: no cover
+
 
 async_context = create_async_context()
 sync_context = create_sync_context()
 generator_context = create_generator_context()
+async_generator_context = create_async_generator_context()
 
 
 def await_it(some_expression: Any) -> Any:
     pass   # pragma: no cover
 
+def gather_it(*some_expressions: Any, in_threads: bool = False) -> List[Any]:  # noqa: ARG001
+    return list(some_expressions)  # pragma: no cover
+
+def map_it(function: Callable[[Any], Any], some_iterable: Iterable[Any], limit: Optional[int] = None) -> List[Any]:  # noqa: ARG001
+    return [function(item) for item in some_iterable]  # pragma: no cover
+
+def is_async() -> bool:
+    return False  # pragma: no cover
+
+def is_generator() -> bool:
+    return False  # pragma: no cover
+
 def yield_from_it(some_iterable: IterableWithResults) -> NoReturn:  # type: ignore[misc, type-arg]
     for value in some_iterable:  # pragma: no cover
         return value  # type: ignore[misc]
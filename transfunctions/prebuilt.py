@@ -0,0 +1,79 @@
+from hashlib import sha256
+from importlib import import_module
+from types import CodeType, FunctionType
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from transfunctions.bytecode_cache import LIBRARY_VERSION
+
+PREBUILT_MODULE_NAME = '_transfunctions_prebuilt'
+
+prebuilt_functions: Dict[Tuple[str, str, int, str], Tuple[Optional[str], CodeType]] = {}
+checked_packages: Set[str] = set()
+
+
+def get_template_hash(code: CodeType, settings: str) -> str:
+    # The code object of the template is available without parsing, and it changes together with everything in the source code except comments and formatting.
+    # The generated code also depends on the version of the library, so a prebuilt module from another version is not used.
+    return sha256(repr((LIBRARY_VERSION, get_code_fingerprint(code), settings)).encode('utf-8')).hexdigest()
+
+
+def get_code_fingerprint(value: Any) -> Any:
+    # The file name and the line numbers are left out, because they change when the package is installed or when lines are added above the template.
+    if isinstance(value, CodeType):
+        return (
+            value.co_name,
+            value.co_code,
+            value.co_names,
+            value.co_varnames,
+            value.co_freevars,
+            value.co_cellvars,
+            value.co_argcount,
+            value.co_posonlyargcount,
+            value.co_kwonlyargcount,
+            value.co_flags,
+            get_code_fingerprint(value.co_consts),
+        )
+    if isinstance(value, tuple):
+        return tuple(get_code_fingerprint(item) for item in value)
+    if isinstance(value, frozenset):
+        # The order of items in a set depends on the hash randomization, so it's different in each process.
+        return ('frozenset', tuple(sorted(repr(get_code_fingerprint(item)) for item in value)))
+    return repr(value)
+
+
+def register_prebuilt_function(module_name: str, qualname: str, first_line_number: int, context_name: str, template_hash: Optional[str], function: FunctionType) -> None:  # noqa: PLR0913
+    prebuilt_functions[(module_name, qualname, first_line_number, context_name)] = (template_hash, function.__code__)
+
+
+def import_prebuilt_modules(module_name: str) -> None:
+    splitted_module_name = module_name.split('.')
+
+    for index in range(len(splitted_module_name), 0, -1):
+        package_name = '.'.join(splitted_module_name[:index])
+        if package_name in checked_packages:
+            continue
+        checked_packages.add(package_name)
+
+        prebuilt_module_name = f'{package_name}.{PREBUILT_MODULE_NAME}'
+        try:
+            import_module(prebuilt_module_name)
+        except ModuleNotFoundError as e:
+            if e.name not in (prebuilt_module_name, package_name):
+                raise
+
+
+def get_prebuilt_code(function: FunctionType, context_name: str, get_template_hash: Callable[[], str], require_hash: bool = False) -> Optional[CodeType]:
+    import_prebuilt_modules(function.__module__)
+
+    prebuilt_function = prebuilt_functions.get((function.__module__, function.__qualname__, function.__code__.co_firstlineno, context_name))
+    if prebuilt_function is None:
+        return None
+
+    # The hash is not saved for functions that were compiled together with the module itself, they can't be outdated. But they are generated without constants.
+    template_hash, code = prebuilt_function
+    if template_hash is None:
+        return None if require_hash else code
+    if template_hash != get_template_hash():
+        return None
+
+    return code
@@ -0,0 +1,72 @@
+from asyncio import ensure_future, gather
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Deque, Dict, Iterable, Iterator, List, Optional
+
+from transfunctions.typing import Callable
+
+# The functions from this module are called by the generated code, where markers are replaced with them. They are not a part of the public API.
+
+
+def gather_in_threads(*functions: Callable[[], Any]) -> List[Any]:
+    if not functions:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(functions)) as executor:
+        futures = [executor.submit(function) for function in functions]
+        return [future.result() for future in futures]
+
+
+def map_in_threads(function: Callable[[Any], Any], iterable: Iterable[Any], limit: Optional[int] = None) -> List[Any]:
+    if limit is None:
+        return [function(item) for item in iterable]
+    check_limit(limit)
+
+    with ThreadPoolExecutor(max_workers=limit) as executor:
+        return list(executor.map(function, iterable))
+
+
+def map_lazily(function: Callable[[Any], Any], iterable: Iterable[Any], limit: Optional[int] = None) -> Iterator[Any]:
+    if limit is None:
+        yield from map(function, iterable)
+        return
+    check_limit(limit)
+
+    # No more than "limit" items are taken from the iterable in advance, so it can be endless.
+    with ThreadPoolExecutor(max_workers=limit) as executor:
+        futures: Deque['Future[Any]'] = deque()
+        for item in iterable:
+            if len(futures) == limit:
+                yield futures.popleft().result()
+            futures.append(executor.submit(function, item))
+        while futures:
+            yield futures.popleft().result()
+
+
+async def map_concurrently(function: Callable[[Any], Awaitable[Any]], iterable: Iterable[Any], limit: Optional[int] = None) -> List[Any]:
+    if limit is None:
+        return await gather(*(function(item) for item in iterable))
+    check_limit(limit)
+
+    # Instead of a task for each item, there are "limit" workers that take items from the same iterator, so the number of tasks doesn't depend on the number of items.
+    items = enumerate(iterable)
+    results: Dict[int, Any] = {}
+
+    async def work() -> None:
+        for index, item in items:
+            results[index] = await function(item)
+
+    workers = [ensure_future(work()) for _ in range(limit)]
+    try:
+        await gather(*workers)
+    except BaseException:
+        for worker in workers:
+            worker.cancel()
+        raise
+
+    return [results[index] for index in range(len(results))]
+
+
+def check_limit(limit: int) -> None:
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        raise ValueError(f'The limit must be a positive integer, not {limit!r}.')
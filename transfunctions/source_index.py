@@ -0,0 +1,69 @@
+import linecache
+from ast import FunctionDef, parse, walk
+from types import FunctionType
+from typing import Dict, List, NamedTuple, Optional
+
+
+class FunctionSpan(NamedTuple):
+    first_line_number: int
+    last_line_number: int
+    source: str
+    node: FunctionDef
+
+
+class SourceIndex:
+    def __init__(self, lines: List[str]) -> None:
+        self.lines = lines
+        self.nodes: Dict[int, FunctionDef] = {}
+
+        # Only decorated functions are stored, so the index doesn't keep the tree of the whole module in memory.
+        for node in walk(parse(''.join(lines))):
+            if isinstance(node, FunctionDef) and node.decorator_list:
+                self.nodes[min(decorator.lineno for decorator in node.decorator_list)] = node
+
+    def get_span(self, first_line_number: int) -> Optional[FunctionSpan]:
+        node = self.nodes.get(first_line_number)
+        if node is None:
+            return None
+
+        last_line_number = node.end_lineno or node.lineno
+        return FunctionSpan(
+            first_line_number,
+            last_line_number,
+            ''.join(self.lines[first_line_number - 1:last_line_number]),
+            node,
+        )
+
+
+indexes: Dict[str, SourceIndex] = {}
+
+
+def get_source_index(function: FunctionType) -> Optional[SourceIndex]:
+    filename = function.__code__.co_filename
+
+    linecache.checkcache(filename)
+    lines = linecache.getlines(filename, function.__globals__)
+    if not lines:
+        return None
+
+    index = indexes.get(filename)
+    if index is None or index.lines is not lines:
+        try:
+            index = SourceIndex(lines)
+        except (SyntaxError, ValueError):
+            return None
+        indexes[filename] = index
+
+    return index
+
+
+def get_function_span(function: FunctionType) -> Optional[FunctionSpan]:
+    index = get_source_index(function)
+    if index is None:
+        return None
+
+    span = index.get_span(function.__code__.co_firstlineno)
+    if span is None or span.node.name != function.__name__:
+        return None
+
+    return span
@@ -1,40 +1,85 @@
 import ast
 from ast import (
     AST,
+    And,
     Assign,
     AsyncFunctionDef,
+    Attribute,
     Await,
+    BoolOp,
     Call,
+    ClassDef,
     Constant,
+    Expr,
+    Expression,
     FunctionDef,
+    If,
+    IfExp,
+    Lambda,
     Load,
     Module,
     Name,
     NodeTransformer,
     Pass,
     Return,
+    Starred,
     Store,
     With,
+    Yield,
     YieldFrom,
     arguments,
+    fix_missing_locations,
     increment_lineno,
+    iter_child_nodes,
     parse,
 )
-from functools import update_wrapper, wraps
-from inspect import getfile, getsource, iscoroutinefunction, isfunction
+from asyncio import get_running_loop
+from collections import OrderedDict
+from concurrent.futures import Executor
+from contextvars import copy_context
+from functools import partial, wraps
+from inspect import (
+    Parameter,
+    getfile,
+    getsource,
+    iscoroutinefunction,
+    isfunction,
+    signature,
+)
 from sys import version_info
-from types import FrameType, FunctionType, MethodType
-from typing import Any, Dict, Generic, List, Optional, Type, Union, cast
+from threading import Lock
+from time import perf_counter
+from types import CodeType, FunctionType, MethodType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
 
 from dill.source import getsource as dill_getsource  # type: ignore[import-untyped]
 
+from transfunctions.bytecode_cache import BytecodeCache, get_bytecode_cache
 from transfunctions.errors import (
     CallTransfunctionDirectlyError,
     DualUseOfDecoratorError,
     WrongDecoratorSyntaxError,
     WrongMarkerSyntaxError,
 )
+from transfunctions.instrumentation import get_stats_collector, measure_stage
+from transfunctions.prebuilt import get_prebuilt_code, get_template_hash
+from transfunctions.source_index import get_function_span
 from transfunctions.typing import (
+    AsyncGenerator,
     Callable,
     Coroutine,
     FunctionParams,
@@ -42,12 +87,31 @@ from transfunctions.typing import (
     ReturnType,
     SomeClassInstance,
 )
-from transfunctions.universal_namespace import UniversalNamespaceAroundFunction
+
+if TYPE_CHECKING:  # pragma: no cover
+    from transfunctions.warmup import WarmupHandle
+
+# Templates that are declared inside other functions get a new function object on each call, but the code of the template is the same, so the generated code can be reused.
+shared_code_cache: Dict[Tuple[str, int, str, str, bool, str], Tuple[CodeType, CodeType]] = {}
+
+# The types of values that can be embedded into the generated code as literals.
+CONSTANT_TYPES = (type(None), type(...), bool, int, float, complex, str, bytes)
+# Only these nodes are evaluated during the generation, because evaluating them can't have side effects. Arithmetic is left to runtime, because something like "N ** N ** N" could take forever.
+CONSTANT_EXPRESSION_NODES = (ast.Constant, ast.BoolOp, ast.UnaryOp, ast.Compare, ast.Tuple, ast.Load, ast.boolop, ast.unaryop, ast.cmpop)
 
 
 class FunctionTransformer(Generic[FunctionParams, ReturnType]):
-    def __init__(
-        self, function: Callable[FunctionParams, ReturnType], decorator_lineno: int, decorator_name: str, frame: FrameType, check_decorators: bool,
+    context_names = ('sync_context', 'async_context', 'generator_context', 'async_generator_context')
+
+    def __init__(  # noqa: PLR0913
+        self,
+        function: Callable[FunctionParams, ReturnType],
+        decorator_lineno: int,
+        decorator_name: str,
+        check_decorators: bool,
+        contexts: Optional[Sequence[str]] = None,
+        constants: Optional[Dict[str, Any]] = None,
+        max_specializations: int = 128,
     ) -> None:
         if isinstance(function, type(self)) and check_decorators:
             raise DualUseOfDecoratorError(f"You cannot use the '{decorator_name}' decorator twice for the same function.")
@@ -57,14 +121,38 @@ class FunctionTransformer(Generic[FunctionParams, ReturnType]):
             raise ValueError(f"Only regular or generator functions can be used as a template for @{decorator_name}. You can't use async functions.")
         if self.is_lambda(function):
             raise ValueError(f"Only regular or generator functions can be used as a template for @{decorator_name}. Don't use lambdas here.")
+        for context_name in contexts or ():
+            if context_name not in self.context_names:
+                raise ValueError(f'Unknown context "{context_name}". Use one of: {", ".join(self.context_names)}.')
+        for constant_name, constant_value in (constants or {}).items():
+            if not isinstance(constant_name, str) or not constant_name.isidentifier():
+                raise ValueError(f'The name of a constant must be a valid identifier, not {constant_name!r}.')
+            if not self.is_constant_value(constant_value):
+                raise ValueError(f'The value of the constant "{constant_name}" can\'t be embedded into the code: {constant_value!r}. Use None, booleans, numbers, strings, bytes or tuples of them.')
+        if not isinstance(max_specializations, int) or isinstance(max_specializations, bool) or max_specializations < 0:
+            raise ValueError(f'The maximum number of specialized functions must be a non-negative integer, not {max_specializations!r}.')
 
         self.function = function
+        # The path by which the transformer can be found in its module. Generated functions are pickled by reference to it, so other processes can import them.
+        self.qualname = function.__qualname__
         self.decorator_lineno = decorator_lineno
         self.decorator_name = decorator_name
-        self.frame = frame
         self.check_decorators = check_decorators
         self.base_object: Optional[SomeClassInstance] = None  # type: ignore[valid-type]
+        self.contexts = tuple(contexts or ())
+        self.constants = dict(constants or {})
+        # The generated code depends on the values of the constants, so they are a part of every key under which this code is cached.
+        self.constants_key = repr(sorted(self.constants.items())) if self.constants else ''
         self.cache: Dict[str, Callable[FunctionParams, ReturnType]] = {}
+        self.locks: Dict[Tuple[str, ...], Lock] = {}
+        self.source_code: Optional[str] = None
+        self.template_tree: Optional[Module] = None
+        self.precompilation: Optional['WarmupHandle'] = None
+        # Specialized functions are kept in the order of use, the least recently used one is evicted first.
+        self.max_specializations = max_specializations
+        self.specializations: 'OrderedDict[Tuple[str, str], Callable[..., Any]]' = OrderedDict()
+        self.specialization_lock = Lock()
+        self.specialization_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
 
     def __call__(self, *args: Any, **kwargs: Any) -> None:  # noqa: ARG002
         raise CallTransfunctionDirectlyError("You can't call a transfunction object directly, create a function, a generator function or a coroutine function from it.")
@@ -74,8 +162,13 @@ class FunctionTransformer(Generic[FunctionParams, ReturnType]):
         base_object: SomeClassInstance,
         owner: Type[SomeClassInstance],
     ) -> 'FunctionTransformer[FunctionParams, ReturnType]':
-        self.base_object = base_object
-        return self
+        if base_object is None:
+            return self
+        return BoundFunctionTransformer(self, base_object)
+
+    @property
+    def variants(self) -> 'Variants':
+        return Variants(self)
 
     @staticmethod
     def is_lambda(function: Callable[FunctionParams, ReturnType]) -> bool:
@@ -84,77 +177,317 @@ class FunctionTransformer(Generic[FunctionParams, ReturnType]):
         return isinstance(function, type(lambda_example)) and function.__name__ == lambda_example.__name__
 
     def get_usual_function(self, addictional_transformers: Optional[List[NodeTransformer]] = None) -> Callable[FunctionParams, ReturnType]:
-        return cast(Callable[FunctionParams, ReturnType], self.extract_context('sync_context', addictional_transformers=addictional_transformers))
+        return cast('Callable[FunctionParams, ReturnType]', self.extract_context('sync_context', addictional_transformers=addictional_transformers))
 
     def get_async_function(self) -> Callable[FunctionParams, Coroutine[Any, Any, ReturnType]]:
-        original_function = self.function
+        return cast('Callable[FunctionParams, Coroutine[Any, Any, ReturnType]]', self.extract_context('async_context'))
 
-        class ConvertSyncFunctionToAsync(NodeTransformer):
-            def visit_FunctionDef(self, node: FunctionDef) -> Union[FunctionDef, AsyncFunctionDef]:  # noqa: N802
-                if node.name == original_function.__name__:
-                    return AsyncFunctionDef(  # type: ignore[no-any-return, call-overload, unused-ignore]
-                        name=original_function.__name__,
-                        args=node.args,
-                        body=node.body,
-                        decorator_list=node.decorator_list,
-                        lineno=node.lineno,
-                        end_lineno=node.end_lineno,
-                        col_offset=node.col_offset,
-                        end_col_offset=node.end_col_offset,
-                    )
+    def get_generator_function(self) -> Callable[FunctionParams, Generator[ReturnType, None, None]]:
+        return cast('Callable[FunctionParams, Generator[ReturnType, None, None]]', self.extract_context('generator_context'))
+
+    def get_async_generator_function(self) -> Callable[FunctionParams, AsyncGenerator[ReturnType, None]]:
+        return cast('Callable[FunctionParams, AsyncGenerator[ReturnType, None]]', self.extract_context('async_generator_context'))
+
+    def get_offloaded_async_function(self, executor: Optional[Executor] = None) -> Callable[FunctionParams, Coroutine[Any, Any, ReturnType]]:
+        # The usual function is executed in a thread, so the blocking code of the template doesn't stop the event loop. None means the default executor of the loop.
+        usual_function = self.get_usual_function()
+
+        @wraps(self.function)
+        async def wrapper(*args: FunctionParams.args, **kwargs: FunctionParams.kwargs) -> ReturnType:
+            # The context variables are copied, because threads of the executor don't see the context of the calling task.
+            return await get_running_loop().run_in_executor(executor, partial(copy_context().run, usual_function, *args, **kwargs))
+
+        return wrapper
+
+    def get_specialized_function(self, context_name: str, **fixed_arguments: Any) -> Callable[..., Any]:
+        if context_name not in self.context_names:
+            raise ValueError(f'Unknown context "{context_name}". Use one of: {", ".join(self.context_names)}.')
+        key = (context_name, repr(sorted(fixed_arguments.items())))
+
+        with self.specialization_lock:
+            function = self.specializations.get(key)
+            is_hit = function is not None
+            stats_collector = get_stats_collector()
+            if stats_collector is not None:
+                stats_collector.add_cache_result('specialization', is_hit)
+
+            if function is not None:
+                self.specialization_stats['hits'] += 1
+                self.specializations.move_to_end(key)
+                return function
+
+            self.specialization_stats['misses'] += 1
+            function = self.create_specialized_function(context_name, fixed_arguments)
+
+            if self.max_specializations:
+                self.specializations[key] = function
+                while len(self.specializations) > self.max_specializations:
+                    self.specializations.popitem(last=False)
+                    self.specialization_stats['evictions'] += 1
+
+            return function
+
+    def create_specialized_function(self, context_name: str, fixed_arguments: Dict[str, Any]) -> Callable[..., Any]:
+        template_signature = signature(self.function)
+        fixable_kinds = (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD, Parameter.KEYWORD_ONLY)
+
+        for argument_name, argument_value in fixed_arguments.items():
+            parameter = template_signature.parameters.get(argument_name)
+            if parameter is None or parameter.kind not in fixable_kinds:
+                raise ValueError(f'The template has no argument "{argument_name}" that can be fixed.')
+            if not self.is_constant_value(argument_value):
+                raise ValueError(f'The value of the argument "{argument_name}" can\'t be embedded into the code: {argument_value!r}. Use None, booleans, numbers, strings, bytes or tuples of them.')
+
+        # The fixed arguments are replaced with their values everywhere in the function, so they must keep these values all the time.
+        template_function_def = cast(FunctionDef, self.get_template_tree(copy=False).body[0])
+        for name in sorted(self.get_bound_names(template_function_def.body)):
+            if name in fixed_arguments:
+                raise ValueError(f'The argument "{name}" is assigned or redefined in the template, so it can\'t be fixed.')
+
+        with measure_stage('specialize'):
+            tree = self.transform_tree(context_name, None, {**self.constants, **fixed_arguments})
+            function_def = cast(FunctionDef, tree.body[0])
+            function_def.args.posonlyargs = [argument for argument in function_def.args.posonlyargs if argument.arg not in fixed_arguments]
+            function_def.args.args = [argument for argument in function_def.args.args if argument.arg not in fixed_arguments]
+            function_def.args.kwonlyargs = [argument for argument in function_def.args.kwonlyargs if argument.arg not in fixed_arguments]
+            code = self.compile_tree(tree)
+
+        function = self.create_function_from_code(code, context_name)
+        # There is no path in the module by which a specialized function could be found, so the name only shows which arguments are fixed. Such functions can't be pickled.
+        function.__qualname__ = f'{self.qualname}.variants.{context_name}[{", ".join(f"{name}={value!r}" for name, value in sorted(fixed_arguments.items()))}]'
+
+        # The default values of the remaining arguments are the same as in the template, and the signature is shown without the fixed arguments.
+        parameters = [parameter for parameter in template_signature.parameters.values() if parameter.name not in fixed_arguments]
+        function.__defaults__ = tuple(parameter.default for parameter in parameters if parameter.kind != Parameter.KEYWORD_ONLY and parameter.default is not Parameter.empty) or None
+        function.__kwdefaults__ = {parameter.name: parameter.default for parameter in parameters if parameter.kind == Parameter.KEYWORD_ONLY and parameter.default is not Parameter.empty} or None
+        function.__signature__ = template_signature.replace(parameters=parameters)  # type: ignore[attr-defined]
+
+        return function
+
+    def get_process_pool_function(self, pool: Any, chunksize: int = 1) -> Callable[[Iterable[Sequence[Any]]], List[ReturnType]]:
+        # Both concurrent.futures.ProcessPoolExecutor and multiprocessing.Pool have a map() method with the same signature, so any of them can be used here.
+        function: Any = self.get_usual_function()
+        if isinstance(function, MethodType):
+            # Bound methods are pickled as an attribute of the instance, and that's a transformer, not a function, so the instance is passed separately.
+            function = partial(function.__func__, function.__self__)
+        call = partial(self.call_with_arguments, function)
+
+        def map_arguments(arguments: Iterable[Sequence[Any]]) -> List[ReturnType]:
+            return list(pool.map(call, arguments, chunksize=chunksize))
+
+        return map_arguments
+
+    @staticmethod
+    def call_with_arguments(function: Callable[..., ReturnType], arguments: Sequence[Any]) -> ReturnType:
+        return function(*arguments)
+
+    @classmethod
+    def is_constant_value(cls, value: Any) -> bool:
+        if isinstance(value, tuple):
+            return all(cls.is_constant_value(item) for item in value)
+        return isinstance(value, CONSTANT_TYPES)
+
+    @staticmethod
+    def evaluate_constant_expression(node: ast.expr) -> Tuple[bool, Any]:
+        # Returns whether the value is known at the time of the generation, and the value itself.
+        if not all(isinstance(child, CONSTANT_EXPRESSION_NODES) for child in ast.walk(node)):
+            return False, None
+        try:
+            return True, eval(compile(fix_missing_locations(Expression(body=node)), '<constant>', 'eval'), {'__builtins__': {}})
+        except Exception:  # noqa: BLE001
+            # For example, a division by zero. It's left to be raised at runtime, as it would be without the constants.
+            return False, None
+
+    @classmethod
+    def get_folding_transformer(cls, context_name: str, constants: Dict[str, Any]) -> NodeTransformer:
+        predicates = {
+            'is_async': context_name in ('async_context', 'async_generator_context'),
+            'is_generator': context_name in ('generator_context', 'async_generator_context'),
+        }
+
+        class FoldConstants(NodeTransformer):
+            def visit_Name(self, node: Name) -> Union[Name, Constant]:  # noqa: N802
+                if isinstance(node.ctx, Load) and node.id in constants:
+                    return ast.copy_location(Constant(value=constants[node.id]), node)
                 return node
 
-        class ExtractAwaitExpressions(NodeTransformer):
-            def visit_Call(self, node: Call) -> Union[Call, Await]:  # noqa: N802
-                if isinstance(node.func, Name) and node.func.id == 'await_it':
-                    if len(node.args) != 1 or node.keywords:
-                        raise WrongMarkerSyntaxError('The "await_it" marker can be used with only one positional argument.')
-
-                    return Await(
-                        value=node.args[0],
-                        lineno=node.lineno,
-                        end_lineno=node.end_lineno,
-                        col_offset=node.col_offset,
-                        end_col_offset=node.end_col_offset,
-                    )
+            def visit_Call(self, node: Call) -> Union[Call, Constant]:  # noqa: N802
+                self.generic_visit(node)
+                if isinstance(node.func, Name) and node.func.id in predicates:
+                    if node.args or node.keywords:
+                        raise WrongMarkerSyntaxError(f'The "{node.func.id}" marker can be used only without arguments.')
+                    return ast.copy_location(Constant(value=predicates[node.func.id]), node)
                 return node
 
-        return cast(
-            Callable[FunctionParams, Coroutine[Any, Any, ReturnType]],
-            self.extract_context(
-                'async_context',
-                addictional_transformers=[
-                    ConvertSyncFunctionToAsync(),
-                    ExtractAwaitExpressions(),
-                ],
-            ),
-        )
+            def visit_BoolOp(self, node: BoolOp) -> AST:  # noqa: N802
+                self.generic_visit(node)
+                # Only the operands at the beginning are dropped, because everything after an unknown operand can be reached or not.
+                while len(node.values) > 1 and isinstance(node.values[0], Constant):
+                    if bool(node.values[0].value) != isinstance(node.op, And):
+                        return node.values[0]
+                    node.values.pop(0)
+                return node.values[0] if len(node.values) == 1 else node
+
+            def visit_If(self, node: If) -> Union[AST, List[AST]]:  # noqa: N802
+                self.generic_visit(node)
+                is_known, value = cls.evaluate_constant_expression(node.test)
+                if not is_known:
+                    return node
+                statements = node.body if value else node.orelse
+                return cast(List[AST], statements) or ast.copy_location(Pass(), node)
+
+            def visit_IfExp(self, node: IfExp) -> AST:  # noqa: N802
+                self.generic_visit(node)
+                is_known, value = cls.evaluate_constant_expression(node.test)
+                if not is_known:
+                    return node
+                return node.body if value else node.orelse
+
+        return FoldConstants()
 
-    def get_generator_function(self) -> Callable[FunctionParams, Generator[ReturnType, None, None]]:
-        class ConvertYieldFroms(NodeTransformer):
-            def visit_Call(self, node: Call) -> Optional[Union[AST, List[AST]]]:  # noqa: N802
-                if isinstance(node.func, Name) and node.func.id == 'yield_from_it':
-                    if len(node.args) != 1 or node.keywords:
-                        raise WrongMarkerSyntaxError('The "yield_from_it" marker can be used with only one positional argument.')
-
-                    return YieldFrom(
-                        value=node.args[0],
-                        lineno=node.lineno,
-                        end_lineno=node.end_lineno,
-                        col_offset=node.col_offset,
-                        end_col_offset=node.end_col_offset,
-                    )
-                return node
+    @staticmethod
+    def get_module_attribute(module_name: str, attribute_name: str, node: AST) -> Attribute:
+        # The generated code imports what it needs by itself, so the module of the template doesn't have to import anything.
+        module: Union[Call, Attribute] = Call(func=Name(id='__import__', ctx=Load()), args=[Constant(value=module_name)], keywords=[])
+        for name in module_name.split('.')[1:]:
+            module = Attribute(value=module, attr=name, ctx=Load())
+        return ast.copy_location(Attribute(value=module, attr=attribute_name, ctx=Load()), node)
+
+    @classmethod
+    def get_gather_transformer(cls, context_name: str) -> NodeTransformer:
+        is_async = context_name in ('async_context', 'async_generator_context')
+
+        class ExtractGatherExpressions(NodeTransformer):
+            def visit_Call(self, node: Call) -> Union[Call, Await, ast.List]:  # noqa: N802
+                self.generic_visit(node)
+                if not (isinstance(node.func, Name) and node.func.id == 'gather_it'):
+                    return node
+
+                in_threads = False
+                for keyword in node.keywords:
+                    if keyword.arg != 'in_threads' or not isinstance(keyword.value, Constant) or not isinstance(keyword.value.value, bool):
+                        raise WrongMarkerSyntaxError('The "gather_it" marker accepts only positional arguments and the "in_threads" flag, which should be True or False.')
+                    in_threads = keyword.value.value
+
+                if is_async:
+                    # In an async function, all awaitables are awaited at the same time, and the results are returned in the same order.
+                    return ast.copy_location(Await(value=Call(func=cls.get_module_attribute('asyncio', 'gather', node), args=node.args, keywords=[])), node)
+
+                if in_threads:
+                    if any(isinstance(argument, Starred) for argument in node.args):
+                        raise WrongMarkerSyntaxError('The "gather_it" marker with in_threads=True can\'t be used with starred arguments.')
+                    functions: List[ast.expr] = [ast.copy_location(Lambda(args=cls.get_empty_arguments(), body=argument), argument) for argument in node.args]
+                    return ast.copy_location(Call(func=cls.get_module_attribute('transfunctions.runtime', 'gather_in_threads', node), args=functions, keywords=[]), node)
+
+                # Without an event loop, the expressions are just evaluated one after another.
+                return ast.copy_location(ast.List(elts=node.args, ctx=Load()), node)
+
+        return ExtractGatherExpressions()
+
+    @classmethod
+    def get_map_transformer(cls, context_name: str) -> NodeTransformer:
+        if context_name in ('async_context', 'async_generator_context'):
+            function_name = 'map_concurrently'
+        elif context_name == 'generator_context':
+            function_name = 'map_lazily'
+        else:
+            function_name = 'map_in_threads'
 
-        return cast(
-            Callable[FunctionParams, Generator[ReturnType, None, None]],
-            self.extract_context(
-                'generator_context',
-                addictional_transformers=[
-                    ConvertYieldFroms(),
-                ],
-            ),
-        )
+        class ExtractMapExpressions(NodeTransformer):
+            def visit_Call(self, node: Call) -> Union[Call, Await]:  # noqa: N802
+                self.generic_visit(node)
+                if not (isinstance(node.func, Name) and node.func.id == 'map_it'):
+                    return node
+
+                if len(node.args) != 2 or any(isinstance(argument, Starred) for argument in node.args) or any(keyword.arg != 'limit' for keyword in node.keywords):
+                    raise WrongMarkerSyntaxError('The "map_it" marker can be used with a function, an iterable and an optional "limit" keyword argument.')
+
+                call = ast.copy_location(Call(func=cls.get_module_attribute('transfunctions.runtime', function_name, node), args=node.args, keywords=node.keywords), node)
+                if function_name == 'map_concurrently':
+                    return ast.copy_location(Await(value=call), node)
+                return call
+
+        return ExtractMapExpressions()
+
+    @staticmethod
+    def get_empty_arguments() -> arguments:
+        return arguments(posonlyargs=[], args=[], vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
+
+    @classmethod
+    def get_context_transformers(cls, context_name: str, function_name: str) -> List[NodeTransformer]:
+        return [*cls.get_mode_transformers(context_name, function_name), cls.get_gather_transformer(context_name), cls.get_map_transformer(context_name)]
+
+    @staticmethod
+    def get_mode_transformers(context_name: str, function_name: str) -> List[NodeTransformer]:
+        # An async generator is an async function with yields, so it needs the same conversions as a coroutine function.
+        if context_name in ('async_context', 'async_generator_context'):
+            class ConvertSyncFunctionToAsync(NodeTransformer):
+                def visit_FunctionDef(self, node: FunctionDef) -> Union[FunctionDef, AsyncFunctionDef]:  # noqa: N802
+                    if node.name == function_name:
+                        return AsyncFunctionDef(  # type: ignore[no-any-return, call-overload, unused-ignore]
+                            name=function_name,
+                            args=node.args,
+                            body=node.body,
+                            decorator_list=node.decorator_list,
+                            lineno=node.lineno,
+                            end_lineno=node.end_lineno,
+                            col_offset=node.col_offset,
+                            end_col_offset=node.end_col_offset,
+                        )
+                    return node
+
+            class ExtractAwaitExpressions(NodeTransformer):
+                def visit_Call(self, node: Call) -> Union[Call, Await]:  # noqa: N802
+                    if isinstance(node.func, Name) and node.func.id == 'await_it':
+                        if len(node.args) != 1 or node.keywords:
+                            raise WrongMarkerSyntaxError('The "await_it" marker can be used with only one positional argument.')
+
+                        return Await(
+                            value=node.args[0],
+                            lineno=node.lineno,
+                            end_lineno=node.end_lineno,
+                            col_offset=node.col_offset,
+                            end_col_offset=node.end_col_offset,
+                        )
+                    return node
+
+            class RejectYieldFroms(NodeTransformer):
+                def visit_Call(self, node: Call) -> Call:  # noqa: N802
+                    if isinstance(node.func, Name) and node.func.id == 'yield_from_it':
+                        raise WrongMarkerSyntaxError('The "yield_from_it" marker can\'t be used in an async generator, because "yield from" is not allowed there. Use a loop with "yield" instead.')
+                    self.generic_visit(node)
+                    return node
+
+            transformers: List[NodeTransformer] = [
+                ConvertSyncFunctionToAsync(),
+                ExtractAwaitExpressions(),
+            ]
+            if context_name == 'async_generator_context':
+                transformers.append(RejectYieldFroms())
+
+            return transformers
+
+        if context_name == 'generator_context':
+            class ConvertYieldFroms(NodeTransformer):
+                def visit_Call(self, node: Call) -> Optional[Union[AST, List[AST]]]:  # noqa: N802
+                    if isinstance(node.func, Name) and node.func.id == 'yield_from_it':
+                        if len(node.args) != 1 or node.keywords:
+                            raise WrongMarkerSyntaxError('The "yield_from_it" marker can be used with only one positional argument.')
+
+                        return YieldFrom(
+                            value=node.args[0],
+                            lineno=node.lineno,
+                            end_lineno=node.end_lineno,
+                            col_offset=node.col_offset,
+                            end_col_offset=node.end_col_offset,
+                        )
+                    return node
+
+            return [
+                ConvertYieldFroms(),
+            ]
+
+        return []
 
     @staticmethod
     def clear_spaces_from_source_code(source_code: str) -> str:
@@ -172,35 +505,232 @@ class FunctionTransformer(Generic[FunctionParams, ReturnType]):
         return '\n'.join(new_splitted_source_code)
 
 
-    def extract_context(self, context_name: str, addictional_transformers: Optional[List[NodeTransformer]] = None) -> Callable[FunctionParams, Union[Coroutine[Any, Any, ReturnType], Generator[ReturnType, None, None], ReturnType]]:
-        if context_name in self.cache:
-            return self.cache[context_name]
+    @classmethod
+    def copy_tree(cls, node: Any) -> Any:
+        # It's several times faster than copy.deepcopy(), because it knows that the tree consists only of nodes, lists and immutable values.
+        if isinstance(node, list):
+            return [cls.copy_tree(item) for item in node]
+        if not isinstance(node, AST):
+            return node
+
+        new_node = node.__class__.__new__(node.__class__)
+        for key, value in node.__dict__.items():
+            new_node.__dict__[key] = cls.copy_tree(value) if isinstance(value, (AST, list)) else value
+        return new_node
+
+    def load_source_code(self) -> None:
+        with measure_stage('source.index'):
+            span = get_function_span(self.function)
+
+        if span is not None:
+            self.source_code = span.source
+            self.template_tree = Module(body=[span.node], type_ignores=[])
+            return
+
         try:
-            source_code: str = getsource(self.function)
+            with measure_stage('source.inspect'):
+                self.source_code = getsource(self.function)
         except OSError:
-            source_code = dill_getsource(self.function)
+            with measure_stage('source.dill'):
+                self.source_code = cast(str, dill_getsource(self.function))
+
+    def get_source_code(self) -> str:
+        if self.source_code is None:
+            self.load_source_code()
+
+        return cast(str, self.source_code)
+
+    def get_template_hash(self) -> str:
+        # Prebuilt functions are checked by this hash, so they become outdated when the template or the values of the constants change.
+        return get_template_hash(self.function.__code__, self.constants_key)
+
+    def parse_source_code(self, source_code: str) -> Module:
+        tree = parse(self.clear_spaces_from_source_code(source_code))
+
+        # The line numbers of a separately parsed function start from 1, so they are shifted to match the original file.
+        function_def = cast(FunctionDef, tree.body[0])
+        if function_def.decorator_list:
+            decorator = function_def.decorator_list[0]
+            if isinstance(decorator, Call):
+                decorator = decorator.func
+            if version_info.minor > 10:  # noqa: YTT204
+                increment_lineno(tree, n=(self.decorator_lineno - decorator.lineno))
+            else:
+                increment_lineno(tree, n=(self.decorator_lineno - decorator.lineno - 1))
+
+        return tree
+
+    def get_template_tree(self, copy: bool = True) -> Module:
+        source_code = self.get_source_code()
+
+        if self.template_tree is None:
+            with measure_stage('parse'):
+                self.template_tree = self.parse_source_code(source_code)
+
+        if not copy:
+            return self.template_tree
+        with measure_stage('copy'):
+            return cast(Module, self.copy_tree(self.template_tree))
+
+    def get_cache_key(self, context_name: str, source_code: str, addictional_transformers: Optional[List[NodeTransformer]]) -> str:
+        return BytecodeCache.make_key(
+            source_code,
+            getfile(self.function),
+            context_name,
+            self.decorator_name,
+            str(self.decorator_lineno),
+            str(self.check_decorators),
+            self.constants_key,
+            *(type(addictional_transformer).__qualname__ for addictional_transformer in addictional_transformers or []),
+        )
+
+    def extract_context(self, context_name: str, addictional_transformers: Optional[List[NodeTransformer]] = None) -> Callable[FunctionParams, Union[Coroutine[Any, Any, ReturnType], Generator[ReturnType, None, None], ReturnType]]:
+        # The cache is only read without the lock, and a function gets there only when it's completely ready.
+        function = self.cache.get(context_name)
+        if function is not None:
+            stats_collector = get_stats_collector()
+            if stats_collector is not None:
+                stats_collector.add_cache_result('transformer', True, self.get_full_name(), context_name)
+            return function
+
+        if not addictional_transformers and context_name in self.contexts:
+            context_names = self.contexts
+        else:
+            context_names = (context_name,)
+
+        # Declared contexts are generated together under one lock, so two threads can't take them in a different order.
+        lock = self.locks.get(context_names) or self.locks.setdefault(context_names, Lock())
+
+        with lock:
+            if context_name not in self.cache:
+                self.extract_single_context(context_name, addictional_transformers)
+            for other_context_name in context_names:
+                if other_context_name not in self.cache:
+                    try:
+                        self.extract_single_context(other_context_name, addictional_transformers)
+                    except Exception:  # noqa: BLE001
+                        # An error in another context is not a problem of this caller. It will be raised again when that context is requested.
+                        pass
+
+        return self.cache[context_name]
+
+    def extract_single_context(self, context_name: str, addictional_transformers: Optional[List[NodeTransformer]]) -> Callable[FunctionParams, Union[Coroutine[Any, Any, ReturnType], Generator[ReturnType, None, None], ReturnType]]:
+        stats_collector = get_stats_collector()
+        start_time = perf_counter()
+
+        if addictional_transformers:
+            code = self.load_or_compile_code(context_name, addictional_transformers)
+        else:
+            template_code = self.function.__code__
+            shared_key = (template_code.co_filename, template_code.co_firstlineno, context_name, self.decorator_name, self.check_decorators, self.constants_key)
+            shared_value = shared_code_cache.get(shared_key)
+            # Code objects are compared by value, so a template from a reloaded or changed module doesn't get an outdated code.
+            is_shared = shared_value is not None and shared_value[0] == template_code
+
+            if stats_collector is not None:
+                stats_collector.add_cache_result('shared', is_shared)
+
+            if shared_value is not None and is_shared:
+                code = shared_value[1]
+            else:
+                prebuilt_code = get_prebuilt_code(self.function, context_name, self.get_template_hash, require_hash=bool(self.constants))
+                if stats_collector is not None:
+                    stats_collector.add_cache_result('prebuilt', prebuilt_code is not None)
+                code = prebuilt_code or self.load_or_compile_code(context_name, None)
+                shared_code_cache[shared_key] = (template_code, code)
+
+        with measure_stage('instantiate'):
+            function = self.create_function_from_code(code, context_name)
+
+        if stats_collector is not None:
+            stats_collector.add_cache_result('transformer', False, self.get_full_name(), context_name)
+            stats_collector.add_generation(self.get_full_name(), context_name, perf_counter() - start_time, code)
+
+        return self.save_to_cache(context_name, function)
+
+    def get_full_name(self) -> str:
+        return f'{self.function.__module__}.{self.function.__qualname__}'
+
+    def load_or_compile_code(self, context_name: str, addictional_transformers: Optional[List[NodeTransformer]]) -> CodeType:
+        bytecode_cache = get_bytecode_cache()
+
+        if bytecode_cache is None:
+            return self.compile_context(context_name, addictional_transformers)
+
+        cache_key = self.get_cache_key(context_name, self.get_source_code(), addictional_transformers)
+        code = bytecode_cache.load(cache_key)
+
+        stats_collector = get_stats_collector()
+        if stats_collector is not None:
+            stats_collector.add_cache_result('bytecode', code is not None)
+
+        if code is None:
+            code = self.compile_context(context_name, addictional_transformers)
+            bytecode_cache.save(cache_key, code)
+
+        return code
 
-        converted_source_code = self.clear_spaces_from_source_code(source_code)
-        tree = parse(converted_source_code)
+    def save_to_cache(self, context_name: str, function: Callable[..., Any]) -> Callable[FunctionParams, Union[Coroutine[Any, Any, ReturnType], Generator[ReturnType, None, None], ReturnType]]:
+        self.cache[context_name] = function
+
+        return function
+
+    def create_function_from_code(self, code: CodeType, context_name: str) -> FunctionType:
+        closure_variables = dict(zip(self.function.__code__.co_freevars, self.function.__closure__ or ()))
+
+        function = FunctionType(
+            code,
+            self.function.__globals__,
+            name=self.function.__name__,
+            argdefs=self.function.__defaults__,
+            closure=tuple(closure_variables[name] for name in code.co_freevars) if code.co_freevars else None,
+        )
+        function.__kwdefaults__ = self.function.__kwdefaults__
+
+        wraps(self.function)(function)
+        # The qualified name points to the generated function itself, so pickle can find it by importing the module of the template.
+        function.__qualname__ = f'{self.qualname}.variants.{context_name}'
+
+        return function
+
+    def compile_context(self, context_name: str, addictional_transformers: Optional[List[NodeTransformer]]) -> CodeType:
+        return self.compile_tree(self.transform_tree(context_name, addictional_transformers))
+
+    def compile_tree(self, tree: Module) -> CodeType:
+        # Default values and annotations are taken from the template, so nothing from the place of the definition is needed to execute the code.
+        self.remove_defaults_and_annotations(cast(FunctionDef, tree.body[0]))
+        tree = self.wrap_ast_by_closures(tree)
+        fix_missing_locations(tree)
+
+        with measure_stage('compile'):
+            module_code = compile(tree, filename=getfile(self.function), mode='exec')
+
+        return self.extract_function_code(module_code)
+
+    def extract_function_code(self, module_code: CodeType) -> CodeType:
+        # The module contains only the wrapper, and the wrapper contains only the function itself, so there is no need to execute them.
+        for wrapper_code in module_code.co_consts:
+            if isinstance(wrapper_code, CodeType) and wrapper_code.co_name == 'wrapper':
+                for function_code in wrapper_code.co_consts:
+                    if isinstance(function_code, CodeType) and function_code.co_name == self.function.__name__:
+                        return function_code
+
+        raise ValueError(f'The code of the "{self.function.__name__}" function is not found.')  # pragma: no cover
+
+    def transform_tree(self, context_name: str, addictional_transformers: Optional[List[NodeTransformer]], constants: Optional[Dict[str, Any]] = None) -> Module:
+        tree = self.get_template_tree()
+
+        # A constant is replaced with its value everywhere in the function, so an argument or a variable with the same name would be replaced too.
+        if self.constants:
+            template_function_def = cast(FunctionDef, tree.body[0])
+            for name in sorted(self.get_bound_names([template_function_def.args, *template_function_def.body])):
+                if name in self.constants:
+                    raise ValueError(f'The constant "{name}" is also used as the name of an argument or a variable in the template. Rename one of them.')
         original_function = self.function
         transfunction_decorator: Optional[Name] = None
         decorator_name = self.decorator_name
         check_decorators = self.check_decorators
 
-        class RewriteContexts(NodeTransformer):
-            def visit_With(self, node: With) -> Optional[Union[AST, List[AST]]]:  # noqa: N802
-                if len(node.items) == 1:
-                    if isinstance(node.items[0].context_expr, Name):
-                        context_expr = node.items[0].context_expr
-                    elif isinstance(node.items[0].context_expr, Call) and isinstance(node.items[0].context_expr.func, ast.Name):
-                        context_expr = node.items[0].context_expr.func
-
-                    if context_expr.id == context_name:
-                        return cast(List[AST], node.body)
-                    if context_expr.id != context_name and context_expr.id in ('async_context', 'sync_context', 'generator_context'):
-                        return None
-                return node
-
         class DeleteDecorator(NodeTransformer):
             def visit_FunctionDef(self, node: FunctionDef) -> Optional[Union[AST, List[AST]]]:  # noqa: N802
                 if node.name == original_function.__name__:
@@ -227,45 +757,99 @@ class FunctionTransformer(Generic[FunctionParams, ReturnType]):
                     node.decorator_list = []
                 return node
 
-        RewriteContexts().visit(tree)
-        DeleteDecorator().visit(tree)
+        with measure_stage('transform.DeleteDecorator'):
+            DeleteDecorator().visit(tree)
+        self.apply_context(tree, original_function.__name__, context_name, addictional_transformers, self.constants if constants is None else constants)
+
+        return tree
+
+    @classmethod
+    def apply_context(cls, tree: Module, function_name: str, context_name: str, addictional_transformers: Optional[List[NodeTransformer]], constants: Optional[Dict[str, Any]] = None) -> None:
+        class RewriteContexts(NodeTransformer):
+            def visit_With(self, node: With) -> Optional[Union[AST, List[AST]]]:  # noqa: N802
+                if len(node.items) == 1:
+                    if isinstance(node.items[0].context_expr, Name):
+                        context_expr = node.items[0].context_expr
+                    elif isinstance(node.items[0].context_expr, Call) and isinstance(node.items[0].context_expr.func, ast.Name):
+                        context_expr = node.items[0].context_expr.func
+
+                    if context_expr.id == context_name:
+                        return cast(List[AST], node.body)
+                    if context_expr.id != context_name and context_expr.id in cls.context_names:
+                        return None
+                return node
+
+        with measure_stage('transform.RewriteContexts'):
+            RewriteContexts().visit(tree)
 
         function_def = cast(FunctionDef, tree.body[0])
+        has_yields = context_name in ('generator_context', 'async_generator_context') and cls.has_yields(function_def)
+
+        with measure_stage('transform.FoldConstants'):
+            cls.get_folding_transformer(context_name, constants or {}).visit(tree)
+
+        if has_yields and not cls.has_yields(function_def):
+            # All the yields were in the cut out branches, but a function of this context must stay a generator.
+            function_def.body.append(If(test=Constant(value=False), body=[Expr(value=Yield(value=None))], orelse=[]))
+
         if not function_def.body:
             function_def.body.append(
                 Pass(
-                    col_offset=tree.body[0].col_offset,
+                    lineno=function_def.lineno,
+                    col_offset=function_def.col_offset,
                 ),
             )
 
-        if addictional_transformers is not None:
-            for addictional_transformer in addictional_transformers:
+        for addictional_transformer in cls.get_context_transformers(context_name, function_name) + (addictional_transformers or []):
+            with measure_stage(f'transform.{type(addictional_transformer).__name__}'):
                 addictional_transformer.visit(tree)
 
-        tree = self.wrap_ast_by_closures(tree)
-
-        if version_info.minor > 10:  # noqa: YTT204
-            increment_lineno(tree, n=(self.decorator_lineno - cast(Name, transfunction_decorator).lineno))
-        else:
-            increment_lineno(tree, n=(self.decorator_lineno - cast(Name, transfunction_decorator).lineno - 1))
-
-        code = compile(tree, filename=getfile(self.function), mode='exec')
-        namespace = UniversalNamespaceAroundFunction(self.function, self.frame)
-        exec(code, namespace)
-        function_factory = namespace['wrapper']
-        result = function_factory()
-        result = self.rewrite_globals_and_closure(result)
-        result = wraps(self.function)(result)
-
-        if self.base_object is not None:
-            result = MethodType(
-                result,
-                self.base_object,
-            )
+    @staticmethod
+    def get_bound_names(nodes: Iterable[AST]) -> Set[str]:
+        # All the names to which something is assigned in the given nodes, including arguments, loop variables, imports and nested definitions.
+        names: Set[str] = set()
+        for statement in nodes:
+            for node in ast.walk(statement):
+                if isinstance(node, Name) and not isinstance(node.ctx, Load):
+                    names.add(node.id)
+                elif isinstance(node, ast.arg):
+                    names.add(node.arg)
+                elif isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef)):
+                    names.add(node.name)
+                elif isinstance(node, ast.alias):
+                    names.add(node.asname or node.name.split('.')[0])
+                elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                    names.update(node.names)
+                else:
+                    # Names of exceptions in "except ... as name" and captures of "match" statements.
+                    for field_name in ('name', 'rest'):
+                        value = getattr(node, field_name, None)
+                        if isinstance(value, str):
+                            names.add(value)
+        return names
 
-        self.cache[context_name] = result
+    @staticmethod
+    def has_yields(function_def: FunctionDef) -> bool:
+        # The yields of nested functions and classes don't make the function itself a generator.
+        nodes: List[AST] = list(function_def.body)
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, (Yield, YieldFrom)) or (isinstance(node, Call) and isinstance(node.func, Name) and node.func.id == 'yield_from_it'):
+                return True
+            if not isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef, Lambda)):
+                nodes.extend(iter_child_nodes(node))
+        return False
 
-        return result  # type: ignore[no-any-return]
+    @staticmethod
+    def remove_defaults_and_annotations(function_def: Union[FunctionDef, AsyncFunctionDef]) -> None:
+        for argument in function_def.args.posonlyargs + function_def.args.args + function_def.args.kwonlyargs:
+            argument.annotation = None
+        for optional_argument in (function_def.args.vararg, function_def.args.kwarg):
+            if optional_argument is not None:
+                optional_argument.annotation = None
+        function_def.args.defaults = []
+        function_def.args.kw_defaults = [None for _ in function_def.args.kwonlyargs]
+        function_def.returns = None
 
     def wrap_ast_by_closures(self, tree: Module) -> Module:
         old_functiondef = tree.body[0]
@@ -290,27 +874,31 @@ class FunctionTransformer(Generic[FunctionParams, ReturnType]):
         return tree
 
 
-    def rewrite_globals_and_closure(self, function: FunctionType) -> FunctionType:
-        # https://stackoverflow.com/a/13503277/14522393
-        all_new_closure_names = set(self.function.__code__.co_freevars)
+class Variants:
+    # Each generated function is available here as an attribute named after its context, for example "template.variants.sync_context". That's the path that pickle uses for generated functions.
+    __slots__ = ('transformer',)
 
-        if self.function.__closure__ is not None:
-            old_function_closure_variables = {name: cell for name, cell in zip(self.function.__code__.co_freevars, self.function.__closure__)}
-            filtered_closure = tuple([cell for name, cell in old_function_closure_variables.items() if name in all_new_closure_names])
-            names = tuple([name for name, cell in old_function_closure_variables.items() if name in all_new_closure_names])
-            new_code = function.__code__.replace(co_freevars=names)
-        else:
-            filtered_closure = None
-            new_code = function.__code__
+    def __init__(self, transformer: FunctionTransformer[Any, Any]) -> None:
+        self.transformer = transformer
 
-        new_function = FunctionType(
-            new_code,
-            self.function.__globals__,
-            name=self.function.__name__,
-            argdefs=self.function.__defaults__,
-            closure=filtered_closure,
-        )
+    def __getattr__(self, context_name: str) -> Callable[..., Any]:
+        if context_name not in FunctionTransformer.context_names:
+            raise AttributeError(f'Unknown context "{context_name}". Use one of: {", ".join(FunctionTransformer.context_names)}.')
+        return self.transformer.extract_context(context_name)
+
+
+class BoundFunctionTransformer(FunctionTransformer[FunctionParams, ReturnType]):
+    # It's created for each access to a transfunction through an instance, so it only keeps the instance and takes everything else from the original transformer.
+    def __init__(self, transformer: FunctionTransformer[FunctionParams, ReturnType], base_object: SomeClassInstance) -> None:
+        self.transformer = transformer
+        self.base_object = base_object
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.transformer, name)
+
+    def extract_context(self, context_name: str, addictional_transformers: Optional[List[NodeTransformer]] = None) -> Callable[FunctionParams, Union[Coroutine[Any, Any, ReturnType], Generator[ReturnType, None, None], ReturnType]]:
+        # The cache of the original transformer contains only unbound functions, which are shared between all instances of the class.
+        return MethodType(self.transformer.extract_context(context_name, addictional_transformers), self.base_object)
 
-        new_function = cast(FunctionType, update_wrapper(new_function, function))
-        new_function.__kwdefaults__ = function.__kwdefaults__
-        return new_function
+    def get_specialized_function(self, context_name: str, **fixed_arguments: Any) -> Callable[..., Any]:
+        return MethodType(self.transformer.get_specialized_function(context_name, **fixed_arguments), self.base_object)
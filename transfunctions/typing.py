@@ -14,9 +14,14 @@ else:
     from typing import TypeAlias
 
 if sys.version_info <= (3, 9):
-    from typing import Callable, Coroutine, Generator  # pragma: no cover
+    from typing import (  # pragma: no cover
+        AsyncGenerator,
+        Callable,
+        Coroutine,
+        Generator,
+    )
 else:
-    from collections.abc import Callable, Coroutine, Generator
+    from collections.abc import AsyncGenerator, Callable, Coroutine, Generator
 
 
 ReturnType = TypeVar('ReturnType')
@@ -28,4 +33,4 @@ if sys.version_info >= (3, 9):
 else:
     IterableWithResults = Iterable  # pragma: no cover
 
-__all__ = ('Callable', 'Coroutine', 'FunctionParams', 'Generator', 'IterableWithResults', 'ParamSpec', 'ReturnType', 'SomeClassInstance', 'TypeAlias')
+__all__ = ('AsyncGenerator', 'Callable', 'Coroutine', 'FunctionParams', 'Generator', 'IterableWithResults', 'ParamSpec', 'ReturnType', 'SomeClassInstance', 'TypeAlias')
@@ -0,0 +1,116 @@
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Any, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from transfunctions.transformer import FunctionTransformer
+
+
+class WarmupResult(NamedTuple):
+    qualname: str
+    context_name: str
+    duration: float
+    error: Optional[BaseException]
+
+
+class WarmupHandle:
+    def __init__(self, tasks: List[Tuple[FunctionTransformer[Any, Any], str]]) -> None:
+        self.tasks = tasks
+        self.results: List[WarmupResult] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.finished = Event()
+        self.lock = Lock()
+
+    def __repr__(self) -> str:
+        return f'<{type(self).__name__} {self.completed}/{self.total}{" finished" if self.done() else ""}>'
+
+    @property
+    def total(self) -> int:
+        return len(self.tasks)
+
+    @property
+    def completed(self) -> int:
+        with self.lock:
+            return len(self.results)
+
+    @property
+    def progress(self) -> float:
+        if not self.tasks:
+            return 1.0
+        return self.completed / self.total
+
+    @property
+    def duration(self) -> Optional[float]:
+        if self.started_at is None:
+            return None
+        if self.finished_at is None:
+            return perf_counter() - self.started_at
+        return self.finished_at - self.started_at
+
+    @property
+    def errors(self) -> List[WarmupResult]:
+        with self.lock:
+            return [result for result in self.results if result.error is not None]
+
+    def done(self) -> bool:
+        return self.finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.finished.wait(timeout)
+
+    def run(self) -> None:
+        self.started_at = perf_counter()
+
+        try:
+            for transformer, context_name in self.tasks:
+                error: Optional[BaseException] = None
+                start_time = perf_counter()
+                try:
+                    transformer.extract_context(context_name)
+                # A variant that can't be generated (for example, a usual function from a template with "await_it") is not a reason to stop, it will raise again when it's really requested.
+                except Exception as e:  # noqa: BLE001
+                    error = e
+
+                with self.lock:
+                    self.results.append(WarmupResult(transformer.function.__qualname__, context_name, perf_counter() - start_time, error))
+        finally:
+            self.finished_at = perf_counter()
+            self.finished.set()
+
+
+def get_transformer(target: Any) -> FunctionTransformer[Any, Any]:
+    if getattr(target, '__is_superfunction__', False):
+        target = target.__transformer__
+
+    if not isinstance(target, FunctionTransformer):
+        raise TypeError(f'Only transfunctions and superfunctions can be warmed up, not {target!r}.')
+
+    return target
+
+
+def warmup(
+    targets: Union[Any, Iterable[Any]],
+    contexts: Optional[Sequence[str]] = None,
+    background: bool = False,
+) -> WarmupHandle:
+    if isinstance(targets, FunctionTransformer) or getattr(targets, '__is_superfunction__', False):
+        targets = [targets]
+
+    for context_name in contexts or ():
+        if context_name not in FunctionTransformer.context_names:
+            raise ValueError(f'Unknown context "{context_name}". Use one of: {", ".join(FunctionTransformer.context_names)}.')
+
+    tasks = []
+    for target in targets:
+        transformer = get_transformer(target)
+        for context_name in contexts or transformer.contexts or FunctionTransformer.context_names:
+            tasks.append((transformer, context_name))
+
+    handle = WarmupHandle(tasks)
+
+    if background:
+        Thread(target=handle.run, name='transfunctions-warmup', daemon=True).start()
+    else:
+        handle.run()
+
+    return handle